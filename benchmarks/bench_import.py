@@ -0,0 +1,20 @@
+"""
+Benchmarks of the import time of `adaptiveheatmap`.
+
+Each is run in a fresh interpreter by asv (``timeraw_`` prefix) so that
+modules imported by previous benchmarks do not hide the cost.  Import
+must stay cheap: in particular, `matplotlib.pyplot` must not be
+imported (see ``tests/test_import.py``).
+"""
+
+
+def timeraw_import_adaptiveheatmap():
+    return """
+    import adaptiveheatmap
+    """
+
+
+def timeraw_import_adaptiveheatmap_utils():
+    return """
+    import adaptiveheatmap.utils
+    """
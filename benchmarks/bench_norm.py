@@ -0,0 +1,44 @@
+"""
+Benchmarks of `QuantileNormalize`.
+"""
+
+from adaptiveheatmap import QuantileNormalize
+
+from .common import NAN_FRACTIONS, QS, SIZES, make_data, make_qs
+
+
+class Autoscale(object):
+    params = [SIZES, NAN_FRACTIONS, QS]
+    param_names = ['size', 'nan_fraction', 'qs']
+
+    def setup(self, size, nan_fraction, qs):
+        self.data = make_data(size, nan_fraction)
+        self.qs = make_qs(qs)
+
+    def time_autoscale(self, size, nan_fraction, qs):
+        QuantileNormalize(qs=self.qs).autoscale(self.data)
+
+    def time_autoscale_kll(self, size, nan_fraction, qs):
+        QuantileNormalize(qs=self.qs, estimator='kll').autoscale(self.data)
+
+    def peakmem_autoscale(self, size, nan_fraction, qs):
+        QuantileNormalize(qs=self.qs).autoscale(self.data)
+
+
+class Call(object):
+    params = [SIZES, QS, ['step', 'interpolate', 'lut']]
+    param_names = ['size', 'qs', 'mode']
+
+    def setup(self, size, qs, mode):
+        self.data = make_data(size, 0.1)
+        norm_kw = dict(interpolate=mode == 'interpolate',
+                       lut_size=4096 if mode == 'lut' else None)
+        self.norm = QuantileNormalize(qs=make_qs(qs), **norm_kw)
+        self.norm.autoscale(make_data(min(size, 10 ** 6), 0.1, seed=1))
+        self.norm(self.data[:10])  # build the lookup table
+
+    def time_call(self, size, qs, mode):
+        self.norm(self.data)
+
+    def peakmem_call(self, size, qs, mode):
+        self.norm(self.data)
@@ -0,0 +1,47 @@
+"""
+End-to-end benchmarks of adaptive heatmaps rendered by Agg.
+"""
+
+import numpy
+
+from .common import RENDER_SIZES, make_heatmap, make_image, plot
+
+
+class Render(object):
+    params = [['imshow', 'pcolormesh', 'hist2d', 'hexbin'], RENDER_SIZES,
+              [0.0, 0.1]]
+    param_names = ['kind', 'size', 'nan_fraction']
+
+    def setup(self, kind, size, nan_fraction):
+        self.Z = make_image(size, nan_fraction)
+
+    def time_render(self, kind, size, nan_fraction):
+        ah = make_heatmap(cdf_resolution='auto')
+        plot(ah, kind, self.Z)
+        ah.figure.canvas.draw()
+
+    def peakmem_render(self, kind, size, nan_fraction):
+        ah = make_heatmap(cdf_resolution='auto')
+        plot(ah, kind, self.Z)
+        ah.figure.canvas.draw()
+
+
+class ZAt(object):
+    params = [['imshow', 'pcolormesh', 'pcolormesh-curvilinear'],
+              RENDER_SIZES, [1, 1000]]
+    param_names = ['kind', 'size', 'npoints']
+
+    def setup(self, kind, size, npoints):
+        Z = make_image(size)
+        self.ah = make_heatmap()
+        plot(self.ah, kind.split('-')[0], Z,
+             curvilinear=kind.endswith('curvilinear'))
+        xmin, xmax = self.ah.ax_main.get_xlim()
+        ymin, ymax = self.ah.ax_main.get_ylim()
+        rng = numpy.random.RandomState(0)
+        self.x = rng.uniform(xmin, xmax, npoints)
+        self.y = rng.uniform(ymin, ymax, npoints)
+        self.ah.z_at(self.x[:1], self.y[:1])  # build the spatial index
+
+    def time_z_at(self, kind, size, npoints):
+        self.ah.z_at(self.x, self.y)
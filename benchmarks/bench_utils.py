@@ -0,0 +1,48 @@
+"""
+Benchmarks of the helper functions in `adaptiveheatmap.utils`.
+"""
+
+from adaptiveheatmap.utils import cdf, cumhist, finitevalues
+
+from .common import NAN_FRACTIONS, SIZES, make_data, make_heatmap
+
+
+class FiniteValues(object):
+    params = [SIZES, NAN_FRACTIONS, [False, True]]
+    param_names = ['size', 'nan_fraction', 'masked']
+
+    def setup(self, size, nan_fraction, masked):
+        self.data = make_data(size, nan_fraction, masked=masked)
+
+    def time_finitevalues(self, size, nan_fraction, masked):
+        finitevalues(self.data)
+
+    def peakmem_finitevalues(self, size, nan_fraction, masked):
+        finitevalues(self.data)
+
+
+class CDF(object):
+    params = [SIZES, [None, 1024]]
+    param_names = ['size', 'npoints']
+
+    def setup(self, size, npoints):
+        self.data = make_data(size, 0.1)
+
+    def time_cdf(self, size, npoints):
+        cdf(self.data, npoints=npoints)
+
+
+class CumHist(object):
+    params = [SIZES[:-1], [None, 1024, 'auto']]
+    param_names = ['size', 'resolution']
+
+    def setup(self, size, resolution):
+        self.data = make_data(size, 0.1)
+        self.ax = make_heatmap().ax_cdf
+
+    def time_cumhist(self, size, resolution):
+        cumhist(self.data, ax=self.ax, resolution=resolution)
+
+    def teardown(self, size, resolution):
+        for line in list(self.ax.lines):
+            line.remove()
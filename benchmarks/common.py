@@ -0,0 +1,87 @@
+"""
+Data and figure factories shared by the benchmarks.
+"""
+
+import numpy
+
+# Array sizes (number of elements) used across the suite.  The largest
+# size needs about 1 GB of memory per array.
+SIZES = [10 ** 3, 10 ** 5, 10 ** 6, 10 ** 8]
+
+# Number of pixels of the heatmaps in the end-to-end renders.
+RENDER_SIZES = [10 ** 3, 10 ** 4, 10 ** 6]
+
+NAN_FRACTIONS = [0.0, 0.1, 0.5]
+
+# Passed as `QuantileNormalize(qs=...)`: None, the number of quantiles
+# or a custom array.
+QS = [None, 1000, 'tails']
+
+
+def make_qs(qs):
+    if qs == 'tails':
+        return numpy.concatenate([numpy.linspace(0, 0.01, 50),
+                                  numpy.linspace(0.01, 0.99, 99)[1:-1],
+                                  numpy.linspace(0.99, 1, 50)])
+    return qs
+
+
+def make_data(size, nan_fraction=0.0, masked=False, seed=0):
+    """
+    Heavy-tailed random data with a fraction of invalid values.
+
+    If `masked` is true, the invalid values are masked instead of
+    being NaN.
+    """
+    rng = numpy.random.RandomState(seed)
+    data = rng.standard_cauchy(size)
+    invalid = None
+    if nan_fraction:
+        invalid = rng.uniform(size=size) < nan_fraction
+    if masked:
+        return numpy.ma.MaskedArray(data, mask=invalid)
+    if invalid is not None:
+        data[invalid] = numpy.nan
+    return data
+
+
+def make_image(size, nan_fraction=0.0, seed=0):
+    """
+    Square-ish 2D array with about `size` elements.
+    """
+    ny = int(numpy.sqrt(size))
+    nx = size // ny
+    return make_data(ny * nx, nan_fraction, seed=seed).reshape((ny, nx))
+
+
+def make_heatmap(**kwargs):
+    """
+    Headless `.AdaptiveHeatmap` drawn by the Agg canvas.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from adaptiveheatmap import AdaptiveHeatmap
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return AdaptiveHeatmap.make(figure=figure, events=False, **kwargs)
+
+
+def plot(ah, kind, Z, curvilinear=False):
+    """
+    Plot `Z` with `kind` (e.g., ``'imshow'``) in `ah`.
+    """
+    ny, nx = Z.shape
+    if kind in ('imshow', 'matshow'):
+        return ah.plot_all(kind, Z)
+    if kind in ('hist2d', 'hexbin'):
+        rng = numpy.random.RandomState(0)
+        x, y = rng.randn(2, Z.size)
+        if kind == 'hist2d':
+            return ah.plot_all(kind, x, y, bins=100)
+        return ah.plot_all(kind, x, y, gridsize=100)
+    X, Y = numpy.meshgrid(numpy.arange(nx + 1.0), numpy.arange(ny + 1.0))
+    if curvilinear:
+        X, Y = (X + 10) * numpy.cos(Y / ny), (X + 10) * numpy.sin(Y / ny)
+    return ah.plot_all(kind, X, Y, Z)
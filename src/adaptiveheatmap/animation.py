@@ -0,0 +1,66 @@
+"""
+Animation of a sequence of frames with an adaptive heatmap.
+"""
+
+from matplotlib.animation import FuncAnimation
+
+
+MODES = ('fixed', 'update', 'refit')
+
+
+def animate(ah, frames, mode='fixed', blit=True, **kwargs):
+    """
+    Animate 2D `frames` in a plotted `.AdaptiveHeatmap`.
+
+    The artists created by the plotting function (e.g.,
+    `.AdaptiveHeatmap.imshow`) are reused: each frame is shown by
+    `.AdaptiveHeatmap.set_zdata` and the CDF line and the colorbar are
+    updated in place by `.AdaptiveHeatmap.refresh_sub`.
+
+    Parameters
+    ----------
+    ah : AdaptiveHeatmap
+        Adaptive heatmap already plotted with an image or a mesh.
+    frames : iterable of arrays
+        Passed to `matplotlib.animation.FuncAnimation`.
+    mode : {'fixed', 'update', 'refit'}
+        How the norm follows the frames.
+
+        - ``'fixed'``: `ah.norm` is used as-is; e.g., a norm fitted to
+          all frames by `.QuantileNormalize.fit` beforehand.  Only the
+          main panel is redrawn.
+        - ``'update'``: each frame is folded into the norm by
+          `.QuantileNormalize.update` (see its `window` and `decay`).
+        - ``'refit'``: the norm is re-fitted to each frame by
+          `.QuantileNormalize.fit`.  Use a norm with ``estimator='kll'``
+          to make it fast.
+    blit : bool
+        Passed to `FuncAnimation`.  When blitting, the limits of the
+        CDF panel are not changed during the animation.
+    **kwargs
+        Passed to `FuncAnimation` (e.g., `interval`).
+
+    Returns
+    -------
+    animation : matplotlib.animation.FuncAnimation
+
+    """
+    if mode not in MODES:
+        raise ValueError('mode must be one of {}; got {!r}'
+                         .format(MODES, mode))
+
+    def update(frame):
+        if mode == 'update':
+            ah.norm.update(frame)
+        elif mode == 'refit':
+            ah.norm.fit(frame)
+        ah.set_zdata(frame)
+        artists = [ah.mappable]
+        if mode != 'fixed':
+            ah.mappable.changed()
+            ah.refresh_sub(rescale=not blit)
+            artists.extend([ah.cdf_lines[0], ah.cax_quantile_image])
+        return artists
+
+    return FuncAnimation(ah.figure, update, frames=frames, blit=blit,
+                         **kwargs)
@@ -0,0 +1,212 @@
+"""
+Headless batch rendering of adaptive heatmaps to image files.
+"""
+
+from multiprocessing import Pool
+import os
+import time
+import traceback
+
+import numpy
+
+from .core import AdaptiveHeatmap
+
+
+class RenderJob(object):
+    """
+    Specification of one figure to be rendered by `render_all`.
+
+    Parameters
+    ----------
+    path : str
+        Output file name passed to `Figure.savefig`.
+    kind : str
+        Name of the plotting method such as ``'imshow'`` or
+        ``'pcolormesh'`` (see `.AdaptiveHeatmap.plot_all`).
+    data : tuple, array, str or callable
+        Data source.  A tuple is used as the positional arguments of
+        the plotting method and an array as its only positional
+        argument.  A str is a path to a ``.npy`` file (memory-mapped)
+        or a ``.npz`` file whose arrays are the positional arguments.
+        A callable is called without arguments in the worker and
+        its return value is interpreted as above.  Use paths or
+        callables to avoid sending large arrays to the workers.
+    kwargs : dict
+        Keyword arguments passed to the plotting method (e.g.,
+        ``norm_kw`` or ``cmap``).
+    ah_kw : dict
+        Keyword arguments passed to `.AdaptiveHeatmap.make`.
+    figure_kw : dict
+        Keyword arguments passed to `matplotlib.figure.Figure`.
+    savefig_kw : dict
+        Keyword arguments passed to `Figure.savefig`.
+
+    """
+
+    def __init__(self, path, kind, data, kwargs=None, ah_kw=None,
+                 figure_kw=None, savefig_kw=None):
+        self.path = path
+        self.kind = kind
+        self.data = data
+        self.kwargs = kwargs or {}
+        self.ah_kw = ah_kw or {}
+        self.figure_kw = figure_kw or {}
+        self.savefig_kw = savefig_kw or {}
+
+    def template_key(self):
+        return repr((sorted(self.figure_kw.items()),
+                     sorted(self.ah_kw.items())))
+
+    def load(self):
+        data = self.data
+        if callable(data):
+            data = data()
+        if isinstance(data, str):
+            loaded = numpy.load(data, mmap_mode='r')
+            if isinstance(loaded, numpy.lib.npyio.NpzFile):
+                with loaded:
+                    data = tuple(loaded[name] for name in loaded.files)
+            else:
+                data = loaded
+        if isinstance(data, tuple):
+            return data
+        return (data,)
+
+
+class RenderResult(object):
+    """
+    Outcome of a `RenderJob`.
+
+    Attributes
+    ----------
+    path : str
+    timings : dict
+        Wall time in seconds spent for each stage: ``'load'`` (data
+        source), ``'setup'`` (figure and axes), ``'plot'`` (fitting the
+        norm and plotting all panels), ``'save'`` (drawing and writing
+        the file) and ``'total'``.  ``'setup'`` is the cost of
+        creating or resetting the reused `.AdaptiveHeatmap`.
+    error : str or None
+        Formatted traceback if the job failed.
+    pid : int
+        Process ID of the worker.
+
+    """
+
+    def __init__(self, path, timings, error=None, pid=None):
+        self.path = path
+        self.timings = timings
+        self.error = error
+        self.pid = pid
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<RenderResult {!r} {:.3f}s{}>'.format(
+            self.path, self.timings.get('total', float('nan')),
+            '' if self.ok else ' (failed)')
+
+
+# AdaptiveHeatmaps reused across jobs within a worker process, keyed
+# by RenderJob.template_key():
+_templates = {}
+
+
+def _get_heatmap(job):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    key = job.template_key()
+    ah = _templates.get(key)
+    if ah is None:
+        figure = Figure(**job.figure_kw)
+        FigureCanvasAgg(figure)
+        ah_kw = dict(job.ah_kw, events=False)
+        ah = _templates[key] = AdaptiveHeatmap.make(figure=figure, **ah_kw)
+    else:
+        ah.reset()
+    return ah
+
+
+def render_job(job):
+    """
+    Render `job` (a `RenderJob`) in the current process.
+
+    The figure is drawn with the Agg canvas without touching pyplot
+    and without event handlers.  The `.AdaptiveHeatmap` (figure and
+    axes) is reused by `.AdaptiveHeatmap.reset` for jobs sharing
+    `figure_kw` and `ah_kw`.
+
+    Returns
+    -------
+    result : RenderResult
+        Exceptions are not raised but stored in `RenderResult.error`.
+
+    """
+    timings = {}
+    error = None
+    start = time.time()
+    last = [start]  # a list instead of nonlocal for Python 2
+
+    def lap(stage):
+        now = time.time()
+        timings[stage] = now - last[0]
+        last[0] = now
+
+    try:
+        args = job.load()
+        lap('load')
+        ah = _get_heatmap(job)
+        lap('setup')
+        ah.plot_all(job.kind, *args, **job.kwargs)
+        lap('plot')
+        ah.figure.savefig(job.path, **job.savefig_kw)
+        lap('save')
+    except Exception:
+        error = traceback.format_exc()
+    timings['total'] = time.time() - start
+    return RenderResult(job.path, timings, error=error, pid=os.getpid())
+
+
+def render_all(jobs, processes=None, chunksize=1, callback=None):
+    """
+    Render `jobs` across a process pool.
+
+    Parameters
+    ----------
+    jobs : iterable of RenderJob
+    processes : int or None
+        Number of worker processes (default: number of CPUs).  If 1,
+        jobs are rendered in the current process.
+    chunksize : int
+        Passed to `multiprocessing.Pool.imap`.  Larger values reduce
+        the communication overhead for many small jobs.
+    callback : callable or None
+        Called with each `RenderResult` as soon as it is available
+        (e.g., for logging progress).
+
+    Returns
+    -------
+    results : list of RenderResult
+        In the order of `jobs`.  Failed jobs do not stop the batch;
+        check `RenderResult.ok`.
+
+    """
+    results = []
+    if processes == 1:
+        outcomes = map(render_job, jobs)
+        pool = None
+    else:
+        pool = Pool(processes)
+        outcomes = pool.imap(render_job, jobs, chunksize)
+    try:
+        for result in outcomes:
+            if callback is not None:
+                callback(result)
+            results.append(result)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return results
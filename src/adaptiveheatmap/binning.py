@@ -0,0 +1,346 @@
+"""
+Streaming 2D binning of point clouds larger than memory.
+
+The binners accumulate counts (and sums of weights) chunk by chunk,
+can be merged with each other (e.g., when partial results are computed
+in parallel or on different machines) and are plotted by
+`.AdaptiveHeatmap.plot_binned` through the adaptive norm and the CDF
+panel.
+
+>>> import numpy
+>>> hist = Histogram2D(bins=2, range=[[0, 1], [0, 1]])
+>>> _ = hist.update([0.1, 0.2, 0.9], [0.1, 0.7, 0.2])
+>>> hist.values()
+array([[1., 1.],
+       [1., 0.]])
+
+"""
+
+import numpy
+
+from .utils import map_ordered, worker_count
+
+STATISTICS = ('count', 'sum', 'mean')
+
+
+def iterpoints(x, y, weights=None, chunksize=2 ** 20):
+    """
+    Iterate over ``(x, y, weights)`` in chunks of `chunksize` points.
+
+    `x`, `y` and `weights` may be memory-mapped arrays (or anything
+    supporting slicing and ``len``) so that only one chunk is loaded
+    at a time.
+    """
+    for start in range(0, len(x), chunksize):
+        stop = start + chunksize
+        yield (x[start:stop], y[start:stop],
+               None if weights is None else weights[start:stop])
+
+
+class _Binner(object):
+
+    def _zeros(self):
+        raise NotImplementedError
+
+    def _index(self, x, y):
+        """
+        Return flat bin indices of points ``(x, y)`` and the validity.
+        """
+        raise NotImplementedError
+
+    def _init_accumulators(self):
+        self.counts = self._zeros()
+        self.sums = None
+
+    def update(self, x, y, weights=None):
+        """
+        Accumulate points ``(x, y)`` (with optional `weights`).
+
+        Points outside of the bins or with non-finite coordinates are
+        ignored.
+        """
+        x = numpy.asarray(x, dtype=float).reshape(-1)
+        y = numpy.asarray(y, dtype=float).reshape(-1)
+        index, valid = self._index(x, y)
+        index = index[valid]
+        size = self.counts.size
+        # Accumulate into flat views of the (possibly 2D) accumulators:
+        counts = self.counts.reshape(-1)
+        counts += numpy.bincount(index, minlength=size)
+        if weights is not None:
+            weights = numpy.asarray(weights, dtype=float).reshape(-1)
+            if self.sums is None:
+                self.sums = self._zeros().astype(float)
+            sums = self.sums.reshape(-1)
+            sums += numpy.bincount(index, weights=weights[valid],
+                                   minlength=size)
+        return self
+
+    def _empty_like(self):
+        other = object.__new__(type(self))
+        other.__dict__.update(self.__dict__)
+        other._init_accumulators()
+        return other
+
+    def update_chunks(self, chunks, n_jobs=None):
+        """
+        Accumulate points from an iterable of ``(x, y)`` or
+        ``(x, y, weights)`` tuples (e.g., `iterpoints`).
+
+        If `n_jobs` is given, chunks are binned by a pool of threads
+        (see `.utils.worker_count`) and the partial results are merged.
+        """
+        def bin_chunk(chunk):
+            return self._empty_like().update(*chunk)
+
+        nw = worker_count(n_jobs)
+        if nw == 1:
+            for chunk in chunks:
+                self.update(*chunk)
+            return self
+        return self.merge(*map_ordered(bin_chunk, chunks, nw))
+
+    def _check_compatible(self, other):
+        raise NotImplementedError
+
+    def merge(self, *others):
+        """
+        Fold the points accumulated by `others` into this binner.
+
+        The `others` must have identical bins.
+        """
+        for other in others:
+            self._check_compatible(other)
+            self.counts += other.counts
+            if other.sums is not None:
+                if self.sums is None:
+                    self.sums = self._zeros().astype(float)
+                self.sums += other.sums
+        return self
+
+    def values(self, statistic='count'):
+        """
+        Return the accumulated `statistic` per bin.
+
+        Parameters
+        ----------
+        statistic : {'count', 'sum', 'mean'}
+            ``'sum'`` and ``'mean'`` are the sum and the mean of the
+            weights.  The mean of empty bins is NaN.
+
+        """
+        if statistic not in STATISTICS:
+            raise ValueError('statistic must be one of {}; got {!r}'
+                             .format(STATISTICS, statistic))
+        if statistic == 'count':
+            return self.counts.astype(float)
+        if self.sums is None:
+            raise ValueError('No weights are accumulated.')
+        if statistic == 'sum':
+            return self.sums.copy()
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return numpy.where(self.counts > 0, self.sums / self.counts,
+                               numpy.nan)
+
+
+class Histogram2D(_Binner):
+    """
+    Streaming version of `numpy.histogram2d` (and `Axes.hist2d`).
+
+    Parameters
+    ----------
+    bins : int, [int, int] or [array, array]
+        Number of bins or bin edges in each dimension.
+    range : [[xmin, xmax], [ymin, ymax]]
+        Required unless edges are given in `bins`, as the data is not
+        available at once to determine it.
+
+    Attributes
+    ----------
+    xedges, yedges : array
+    counts : array of shape ``(len(xedges) - 1, len(yedges) - 1)``
+    sums : array or None
+        Sums of the weights (None until weights are given).
+
+    """
+
+    plot_method = 'pcolormesh'
+
+    def __init__(self, bins=10, range=None):
+        if numpy.isscalar(bins):
+            bins = [bins, bins]
+        if range is None:
+            range = [None, None]
+        self.xedges, self.yedges = [
+            self._edges(b, r) for b, r in zip(bins, range)]
+        self._uniform = [numpy.ndim(b) == 0 for b in bins]
+        self._init_accumulators()
+
+    @staticmethod
+    def _edges(bins, range):
+        if numpy.ndim(bins) == 1:
+            return numpy.asarray(bins, dtype=float)
+        if range is None:
+            raise ValueError('range is required when the number of bins'
+                             ' is given')
+        return numpy.linspace(range[0], range[1], bins + 1)
+
+    @property
+    def shape(self):
+        return (len(self.xedges) - 1, len(self.yedges) - 1)
+
+    def _zeros(self):
+        return numpy.zeros(self.shape, dtype=numpy.int64)
+
+    @staticmethod
+    def _locate(edges, v, uniform):
+        n = len(edges) - 1
+        # The last bin includes the right edge as in numpy.histogram:
+        valid = (v >= edges[0]) & (v <= edges[-1])
+        if not uniform:
+            i = numpy.searchsorted(edges, v, side='right') - 1
+            i[v == edges[-1]] = n - 1
+            return i, valid
+        # Computing the index is faster than the binary search; the
+        # round-off errors are corrected by comparing with the edges:
+        f = (v - edges[0]) * (n / (edges[-1] - edges[0]))
+        f[~valid] = 0
+        i = numpy.clip(f, 0, n - 1, out=f).astype(numpy.intp)
+        i -= v < edges[i]
+        i += (v >= edges[i + 1]) & (i < n - 1)
+        return i, valid
+
+    def _index(self, x, y):
+        ix, vx = self._locate(self.xedges, x, self._uniform[0])
+        iy, vy = self._locate(self.yedges, y, self._uniform[1])
+        return ix * self.shape[1] + iy, vx & vy
+
+    def _check_compatible(self, other):
+        if not (numpy.array_equal(self.xedges, other.xedges) and
+                numpy.array_equal(self.yedges, other.yedges)):
+            raise ValueError('Cannot merge histograms with different bins.')
+
+    def plot_args(self, statistic='count'):
+        """
+        Arguments for `Axes.pcolormesh` reproducing `Axes.hist2d`.
+        """
+        return (self.xedges, self.yedges, self.values(statistic).T), {}
+
+    def plot_weights(self, statistic='count'):
+        """
+        Counts of the bins in the order of the values of `plot_args`.
+        """
+        return self.counts.T.astype(float)
+
+
+class HexBin(_Binner):
+    """
+    Streaming version of the binning of `Axes.hexbin`.
+
+    Parameters
+    ----------
+    gridsize : int or (int, int)
+        As in `Axes.hexbin`.
+    extent : (xmin, xmax, ymin, ymax)
+        Required, as the data is not available at once to determine it.
+
+    Attributes
+    ----------
+    counts : array
+        Counts of the hexagons in the order used by `Axes.hexbin`.
+    sums : array or None
+        Sums of the weights (None until weights are given).
+
+    """
+
+    plot_method = 'hexbin'
+
+    def __init__(self, gridsize=100, extent=None):
+        if extent is None:
+            raise ValueError('extent is required for streaming hexbin')
+        if numpy.iterable(gridsize):
+            nx, ny = gridsize
+        else:
+            nx = gridsize
+            ny = int(nx / numpy.sqrt(3))
+        self.gridsize = gridsize
+        self.extent = tuple(extent)
+        self.nx, self.ny = nx, ny
+
+        # Same grid as in Axes.hexbin:
+        xmin, xmax, ymin, ymax = self.extent
+        padding = 1.e-9 * (xmax - xmin)
+        self._xmin = xmin - padding
+        self._ymin = ymin
+        self._sx = (xmax + padding - self._xmin) / nx
+        self._sy = (ymax - ymin) / ny
+        self._init_accumulators()
+
+    def _zeros(self):
+        nx, ny = self.nx, self.ny
+        return numpy.zeros((nx + 1) * (ny + 1) + nx * ny, dtype=numpy.int64)
+
+    def _index(self, x, y):
+        nx1, ny1 = self.nx + 1, self.ny + 1
+        nx2, ny2 = self.nx, self.ny
+        with numpy.errstate(invalid='ignore'):
+            ix = (x - self._xmin) / self._sx
+            iy = (y - self._ymin) / self._sy
+            finite = numpy.isfinite(ix) & numpy.isfinite(iy)
+            ix = numpy.where(finite, ix, -1)
+            iy = numpy.where(finite, iy, -1)
+        ix1 = numpy.round(ix).astype(int)
+        iy1 = numpy.round(iy).astype(int)
+        ix2 = numpy.floor(ix).astype(int)
+        iy2 = numpy.floor(iy).astype(int)
+        d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+        d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+        bdist = d1 < d2
+        valid1 = (0 <= ix1) & (ix1 < nx1) & (0 <= iy1) & (iy1 < ny1)
+        valid2 = (0 <= ix2) & (ix2 < nx2) & (0 <= iy2) & (iy2 < ny2)
+        index = numpy.where(bdist, ix1 * ny1 + iy1,
+                            nx1 * ny1 + ix2 * ny2 + iy2)
+        valid = finite & numpy.where(bdist, valid1, valid2)
+        return index, valid
+
+    def centers(self):
+        """
+        Centers of the hexagons as an array of shape ``(N, 2)``.
+        """
+        nx1, ny1 = self.nx + 1, self.ny + 1
+        nx2, ny2 = self.nx, self.ny
+        offsets = numpy.zeros((len(self.counts), 2))
+        offsets[:nx1 * ny1, 0] = numpy.repeat(numpy.arange(nx1), ny1)
+        offsets[:nx1 * ny1, 1] = numpy.tile(numpy.arange(ny1), nx1)
+        offsets[nx1 * ny1:, 0] = numpy.repeat(numpy.arange(nx2) + 0.5, ny2)
+        offsets[nx1 * ny1:, 1] = numpy.tile(numpy.arange(ny2), nx2) + 0.5
+        offsets *= [self._sx, self._sy]
+        offsets += [self._xmin, self._ymin]
+        return offsets
+
+    def _check_compatible(self, other):
+        if (self.nx, self.ny, self.extent) != (other.nx, other.ny,
+                                               other.extent):
+            raise ValueError('Cannot merge hexbins with different grids.')
+
+    def plot_args(self, statistic='count'):
+        """
+        Arguments for `Axes.hexbin` drawing the accumulated hexagons.
+
+        One point per hexagon (its center) is passed with the
+        accumulated value as ``C``.  Hexagons with undefined values
+        (e.g., the mean of empty hexagons) are not drawn.
+        """
+        values = self.values(statistic)
+        shown = ~numpy.isnan(values)
+        x, y = self.centers()[shown].T
+        kwargs = dict(C=values[shown], gridsize=self.gridsize,
+                      extent=self.extent, reduce_C_function=numpy.sum)
+        return (x, y), kwargs
+
+    def plot_weights(self, statistic='count'):
+        """
+        Counts of the hexagons drawn by `plot_args`.
+        """
+        shown = ~numpy.isnan(self.values(statistic))
+        return self.counts[shown].astype(float)
@@ -0,0 +1,128 @@
+"""
+On-disk cache of fitted `.QuantileNormalize`.
+"""
+
+import hashlib
+import os
+
+import numpy
+
+from .core import QuantileNormalize
+from .utils import iterchunks
+
+
+def data_hash(data, chunksize=2 ** 22):
+    """
+    Content hash (hex digest) of array-like `data`.
+
+    The dtype, the shape, the values and the mask (if any) are hashed.
+    `data` is read chunk by chunk (see `.iterchunks`) so that it works
+    for memory-mapped arrays and datasets larger than memory.  A list
+    of blocks of different shapes is hashed block by block.  One-shot
+    iterables such as generators are rejected as they would be
+    consumed by hashing.
+
+    >>> data_hash([1, 2]) == data_hash(numpy.array([1, 2]))
+    True
+    >>> data_hash([1, 2]) == data_hash([1, 3])
+    False
+    >>> data_hash([[1, 2], [3]]) == data_hash([[1], [2, 3]])
+    False
+
+    """
+    if _is_iterator(data):
+        raise ValueError('Cannot hash a one-shot iterable;'
+                         ' pass a list of blocks or a key.')
+    if not hasattr(data, 'shape'):
+        try:
+            array = numpy.asanyarray(data)
+        except ValueError:  # ragged blocks
+            array = None
+        if array is None or array.dtype == object:
+            h = hashlib.sha1(b'blocks')
+            for block in iterchunks(data):
+                h.update(data_hash(block, chunksize).encode())
+            return h.hexdigest()
+        data = array
+    h = hashlib.sha1()
+    h.update(repr((str(data.dtype), tuple(data.shape))).encode())
+    for block in iterchunks(data, chunksize):
+        h.update(numpy.ascontiguousarray(numpy.ma.getdata(block)).data)
+        if numpy.ma.is_masked(block):
+            h.update(numpy.ascontiguousarray(block.mask).data)
+    return h.hexdigest()
+
+
+def _is_iterator(data):
+    try:
+        return iter(data) is data
+    except TypeError:
+        return False
+
+
+def cached_norm(data, cache_dir, key=None, **norm_kw):
+    """
+    Load a fitted `.QuantileNormalize` from `cache_dir` or fit and save it.
+
+    Parameters
+    ----------
+    data : array-like
+        Data to be fitted (anything accepted by `.iterchunks`).
+    cache_dir : str
+        Directory to store the cache files (created if missing).
+    key : str
+        Cache key.  Defaults to `data_hash` of `data`.  Pass an
+        explicit key (e.g., derived from a file name and modification
+        time) to skip hashing the data.  It is required if `data` is a
+        one-shot iterable such as a generator.
+    **norm_kw
+        Keyword arguments passed to `.QuantileNormalize`.  They are
+        also part of the cache key.  ``estimator`` defaults to
+        ``'kll'`` so that data larger than memory can be fitted in
+        bounded memory; pass ``estimator='exact'`` (or None) for exact
+        quantiles, which keeps all finite values in memory.
+
+    Returns
+    -------
+    norm : QuantileNormalize
+
+    """
+    norm_kw.setdefault('estimator', 'kll')
+    if key is None:
+        if _is_iterator(data):
+            raise ValueError('key is required when data is a one-shot'
+                             ' iterable (e.g., a generator).')
+        key = data_hash(data)
+    h = hashlib.sha1(key.encode())
+    h.update(repr(sorted(norm_kw.items())).encode())
+    path = os.path.join(cache_dir, h.hexdigest() + '.npz')
+    if os.path.exists(path):
+        return QuantileNormalize.load(path, **norm_kw)
+
+    norm = QuantileNormalize(**norm_kw).fit(data)
+    try:
+        os.makedirs(cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+    # Write to a temporary file first so that concurrent readers never
+    # see a partially written cache:
+    tmp = '{}.{}.tmp.npz'.format(path[:-len('.npz')], os.getpid())
+    norm.save(tmp)
+    _replace(tmp, path)
+    return norm
+
+
+def _replace(src, dst):
+    try:
+        replace = os.replace
+    except AttributeError:  # Python 2
+        replace = os.rename
+    try:
+        replace(src, dst)
+    except OSError:
+        # os.rename fails on Windows if another writer created `dst`
+        # first; its result is as good as ours:
+        if not os.path.exists(dst):
+            raise
+        os.remove(src)
@@ -3,11 +3,16 @@ import warnings
 
 from matplotlib import colors
 from matplotlib import gridspec
-from matplotlib import pyplot
-from matplotlib.collections import QuadMesh
+from matplotlib.collections import LineCollection, PolyCollection, \
+    QuadMesh
 import numpy
 
-from .utils import finitevalues, cumhist, undo_xylim
+from .profiling import profiled, stage
+from .quantiles import CDFSummary, WeightedSample, make_estimator, \
+    weighted_quantile
+from .spatial import mesh_index
+from .utils import filtered_values, finitevalues, cumhist, iterchunks, \
+    map_ordered, reduced_cdf, undo_xylim, worker_count
 
 
 class QuantileNormalize(colors.Normalize):
@@ -29,21 +34,148 @@ class QuantileNormalize(colors.Normalize):
     vmin, vmax : float
     clip : bool
         See: `matplotlib.colors.Normalize`.
+    estimator : None, str or callable
+        Quantile estimator used by `autoscale`.  If None (default),
+        `numpy.nanpercentile` is called on the whole filtered data.
+        Otherwise, it is passed to `.quantiles.make_estimator`
+        (e.g., ``'kll'`` for the streaming `.KLLSketch`) and the data
+        is fed to the estimator block by block in a single pass
+        without making a filtered copy of the whole data.
+    estimator_kw : dict
+        Keyword arguments passed to the estimator constructor.
+    block_size : int
+        Number of elements fed to `estimator` at once, and mapped at
+        once by `__call__` when writing to `out` (see `reuse_buffers`).
+    estimator_state
+        The estimator holding the state of the last fit; it is used by
+        `partial_fit` and `merge`.
+    window : None or int
+        Number of recent batches used by `update`.
+    decay : None or float
+        Forgetting factor (between 0 and 1) of the batches in `update`.
+    min_weight : float
+        Batches weighted less than this are dropped in `update`.
+    n_jobs : None or int
+        Number of threads used by `autoscale` and `autoscale_chunked`
+        (negative values count from the number of CPUs; -1 means all
+        CPUs).  Chunks of the data are filtered and summarized by
+        per-chunk estimators in parallel which are then merged.  If
+        `estimator` is None, `.KLLSketch` is used for the parallel path
+        so that the quantiles agree with the serial (exact) ones within
+        its rank error (about 1.7% for the default ``k = 200``; pass a
+        larger `k` via `estimator_kw` for tighter results).  With
+        ``estimator='exact'`` the result is identical to the serial
+        path and only the filtering is parallelized.
+    weights : None or array
+        Weight of each element of the data passed to `autoscale`
+        (e.g., the areas of the cells of a non-uniform mesh or the
+        counts of bins); it must have the same size as the data or be
+        broadcastable to its shape.  The quantiles and `summary` are
+        computed by one sort and a cumulative sum of the weights (see
+        `.quantiles.weighted_quantile`) so that each value counts in
+        proportion to its weight.  It is not supported with
+        `estimator`.
+    keep_data : bool
+        If True (default), keep references to the data passed to
+        `autoscale` and its filtered copy (`filtered_data`).  If False,
+        only `summary` is stored and the data is released right after
+        `autoscale`.
+    summary_size : int
+        Number of CDF knots stored in `summary`.
+    interpolate : bool
+        If True, values are mapped by the piecewise-linear
+        interpolation of the quantile function instead of the step
+        function with ``len(quantile)`` levels.
+    lut_size : None or int
+        If an int, values are mapped using a precomputed lookup table
+        with `lut_size` bins uniformly spanning ``[vmin, vmax]``, which
+        narrows the search of `quantile` to the knots near each bin.
+        The result is the same as the default mapping but it avoids
+        the intermediate masked arrays and full-size temporaries.  It
+        is faster for large images unless many knots share a bin (as
+        for heavy-tailed data), where a larger `lut_size` helps.
+    reuse_buffers : bool
+        If True, output and scratch arrays are allocated once and
+        reused by subsequent calls with arrays of the same shape, to
+        avoid allocations on every redraw.  Note that the returned
+        array is then overwritten by the next call.  `autoscale` also
+        filters the data into a reused buffer, so `filtered_data` is
+        overwritten by the next `autoscale`.
 
     """
 
-    def __init__(self, qs=None, quantile=None, **kwargs):
+    def __init__(self, qs=None, quantile=None, estimator=None,
+                 estimator_kw={}, block_size=2 ** 16,
+                 keep_data=True, summary_size=1024,
+                 interpolate=False, lut_size=None, reuse_buffers=False,
+                 window=None, decay=None, min_weight=1e-3, n_jobs=None,
+                 weights=None, **kwargs):
         self.quantile = quantile
         self.qs = qs
+        self.estimator = estimator
+        self.estimator_kw = estimator_kw
+        self.block_size = block_size
+        self.keep_data = keep_data
+        self.summary_size = summary_size
+        self.interpolate = interpolate
+        self.lut_size = lut_size
+        self._lut = (None, None)
+        self.reuse_buffers = reuse_buffers
+        self._buffers = {}
+        self._raw_data = None
+        self._filtered_data = None
+        self._summary = None
+        self.estimator_state = None
+        self.window = window
+        self.decay = decay
+        self.min_weight = min_weight
+        self._batches = []
+        self._seed = None
+        self.n_jobs = n_jobs
+        self.weights = weights
         colors.Normalize.__init__(self, **kwargs)
+        self._init_range = (self.vmin, self.vmax)
 
         if self.scaled():
             self._set_vmin_vmax()
 
-    def __call__(self, value, clip=None):
+    @profiled('QuantileNormalize.__call__',
+              lambda self, value, *_, **__: [value])
+    def __call__(self, value, clip=None, out=None):
+        """
+        Normalize `value` into the ``[0, 1]`` interval.
+
+        Parameters
+        ----------
+        value : scalar or array-like
+        clip : None or bool
+            See: `matplotlib.colors.Normalize`.
+        out : None or numpy.ndarray
+            Float array of the same shape as `value` to which the
+            result is written.  The returned masked array is a view of
+            `out`.  If None and `reuse_buffers` is True, a buffer owned
+            by the norm is used.  The values are then mapped in blocks
+            of `block_size` elements so that no other array of the
+            size of `value` is allocated.
+        """
         if clip is None:
             clip = self.clip
-
+        if out is None and self.reuse_buffers and numpy.ndim(value) > 0:
+            out = self._get_buffer('out', numpy.shape(value), float)
+
+        if self.interpolate or self.lut_size or out is not None:
+            return self._call_fast(value, clip, out)
+        return self._call_step(value, clip)
+
+    def _get_buffer(self, name, shape, dtype):
+        if not self.reuse_buffers:
+            return None
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self._buffers[name] = numpy.empty(shape, dtype)
+        return buf
+
+    def _call_step(self, value, clip):
         data, is_scalar = self.process_value(value)
 
         self.autoscale_None(data)
@@ -59,13 +191,175 @@ class QuantileNormalize(colors.Normalize):
             # code.
 
         idx = numpy.searchsorted(self.quantile, data)
-        result = idx / (len(self.quantile) - 1)
-        result = numpy.ma.masked_array(result, numpy.ma.getmask(value))
+        result = numpy.divide(idx, len(self.quantile) - 1.0)
+        result = numpy.ma.masked_array(result, numpy.ma.getmask(value),
+                                       copy=False)
         if is_scalar:
             result = result[0]
         return result
 # https://matplotlib.org/users/colormapnorms.html
 
+    def _call_fast(self, value, clip, out=None):
+        is_scalar = numpy.ndim(value) == 0
+        data = numpy.ma.asanyarray(value)
+        if is_scalar:
+            data = data.reshape(1)
+            out = None
+        self.autoscale_None(data)
+
+        x = numpy.ma.getdata(data)
+        quantile = self.quantile
+        n = len(quantile)
+        if self.lut_size and self.vmax > self.vmin:
+            result = self._lookup(x, clip, out)
+        elif self.interpolate:
+            levels = numpy.linspace(0, 1, n)
+            right = 1 if clip else n / (n - 1.0)
+
+            def interp(xb, ob):
+                ob[...] = numpy.interp(xb, quantile, levels, left=0,
+                                       right=right)
+
+            result = self._map_blocks(x, out, interp)
+        else:
+            vmax = self.vmax
+
+            def step(xb, ob):
+                if clip:
+                    xb = numpy.minimum(xb, vmax)
+                numpy.divide(numpy.searchsorted(quantile, xb), n - 1.0,
+                             out=ob)
+
+            result = self._map_blocks(x, out, step)
+        result = numpy.ma.masked_array(result, numpy.ma.getmask(data),
+                                       copy=False)
+        if is_scalar:
+            result = result[0]
+        return result
+
+    def _map_blocks(self, x, out, fun):
+        """
+        Call ``fun(x_block, out_block)`` on blocks of `block_size` values.
+        """
+        if out is None:
+            out = numpy.empty(x.shape)
+        elif not out.flags.c_contiguous:
+            out[...] = self._map_blocks(x, None, fun)
+            return out
+        flat_x = x.reshape(-1)
+        flat_out = out.reshape(-1)
+        for start in range(0, flat_x.size, self.block_size):
+            stop = start + self.block_size
+            fun(flat_x[start:stop], flat_out[start:stop])
+        return out
+
+    def _lookup(self, x, clip, out=None):
+        """
+        Map `x` by a bucketed search of `quantile` (see `_get_lut`).
+        """
+        lo_table, hi_table, offset, scale, steps, knots = self._get_lut()
+        n = len(self.quantile)
+        block = min(self.block_size, x.size) or 1
+        t = self._get_scratch('t', block, float)
+        idx = self._get_scratch('idx', block, numpy.intp)
+        lo = self._get_scratch('lo', block, numpy.intp)
+        hi = self._get_scratch('hi', block, numpy.intp)
+        mid = self._get_scratch('mid', block, numpy.intp)
+        less = self._get_scratch('less', block, bool)
+        if clip:
+            clipped = self._get_scratch('clipped', block, float)
+        compare = numpy.less_equal if self.interpolate else numpy.less
+
+        def lookup(xb, ob):
+            m = len(xb)
+            tb, ib, lb, hb, mb, cb = (t[:m], idx[:m], lo[:m], hi[:m],
+                                      mid[:m], less[:m])
+            if clip:
+                xb = numpy.minimum(xb, self.vmax, out=clipped[:m])
+            numpy.subtract(xb, offset, out=tb)
+            tb *= scale
+            # fmax/fmin also replace NaN with the bound:
+            numpy.fmax(tb, 0, out=tb)
+            numpy.fmin(tb, len(lo_table) - 1, out=tb)
+            numpy.copyto(ib, tb, casting='unsafe')
+            lo_table.take(ib, out=lb, mode='clip')
+            hi_table.take(ib, out=hb, mode='clip')
+            # Binary search of the knots within the bracket [lo, hi]
+            # of each value; `steps` bounds the width of the brackets:
+            for _ in range(steps):
+                numpy.add(lb, hb, out=mb)
+                numpy.right_shift(mb, 1, out=mb)
+                compare(knots.take(mb, out=tb, mode='clip'), xb, out=cb)
+                mb += 1
+                numpy.copyto(lb, mb, where=cb)
+                mb -= 1
+                numpy.logical_not(cb, out=cb)
+                numpy.copyto(hb, mb, where=cb)
+            if self.interpolate:
+                self._interpolate_block(xb, lb, ob, clip)
+            else:
+                numpy.multiply(lb, 1 / (n - 1.0), out=ob)
+
+        return self._map_blocks(x, out, lookup)
+
+    def _interpolate_block(self, x, count, out, clip):
+        # `count` is the number of knots <= x:
+        q = self.quantile
+        n = len(q)
+        numpy.clip(count, 1, n - 1, out=count)
+        lower = q.take(count - 1)
+        upper = q.take(count)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            frac = (x - lower) / (upper - lower)
+        numpy.clip(frac, 0, 1, out=frac)
+        numpy.add(count - 1, frac, out=out)
+        out /= n - 1.0
+        out[x < q[0]] = 0
+        out[x >= q[-1]] = 1
+        if not clip:
+            out[x > q[-1]] = n / (n - 1.0)
+
+    def _get_scratch(self, name, size, dtype):
+        buf = self._get_buffer(name, (size,), numpy.dtype(dtype))
+        if buf is None:
+            buf = numpy.empty(size, dtype)
+        return buf
+
+    def _get_lut(self):
+        """
+        Return the bucket tables for `_lookup`.
+
+        The range ``[vmin - w, vmax + 2 * w)``, where ``w`` is
+        ``(vmax - vmin) / lut_size``, is split into bins of width ``w``
+        and value ``x`` falls into bin ``int((x - offset) * scale)``
+        (clipped to the first and the last bin).  ``lo_table[i]`` and
+        ``hi_table[i]`` bracket the number of knots of `quantile` below
+        any value in bin ``i`` (with one bin of slack on each side to
+        absorb rounding), so that the mapping is resolved exactly by
+        at most `steps` bisections of ``knots``.
+        """
+        key = (self.vmin, self.vmax, self.lut_size,
+               numpy.asarray(self.quantile).tobytes())
+        if self._lut[0] == key:
+            return self._lut[1]
+
+        q = numpy.asarray(self.quantile, dtype=float)
+        n = len(q)
+        size = self.lut_size
+        width = (self.vmax - self.vmin) / float(size)
+        offset = self.vmin - width
+        edges = offset + numpy.arange(size + 4) * width
+        first = numpy.searchsorted(q, edges)
+        lo_table = numpy.concatenate([[0], first[:-2]])
+        hi_table = numpy.concatenate([first[2:], [n]])
+        steps = int(max(hi_table - lo_table)).bit_length()
+        # NaN never compares True, so the sentinel stops the search:
+        knots = numpy.append(q, numpy.nan)
+        value = (lo_table.astype(numpy.intp), hi_table.astype(numpy.intp),
+                 offset, 1 / width, steps, knots)
+        self._lut = (key, value)
+        return value
+
     def scaled(self):
         return self.quantile is not None
 
@@ -73,11 +367,391 @@ class QuantileNormalize(colors.Normalize):
         if not self.scaled():
             self.autoscale(data)
 
+    @profiled('QuantileNormalize.autoscale', lambda self, data: [data])
     def autoscale(self, data):
         self._raw_data = data
-        self._filtered_data = self._filter_data(data, self.vmin, self.vmax)
-        self.quantile = self._calc_quantile(self._filtered_data, self.qs)
+        self._reset_state()
+        self._filter_range = (self.vmin, self.vmax)
+        n_workers = self._n_workers()
+        if self.weights is not None:
+            self._autoscale_weighted(data)
+        elif self.estimator is None and n_workers == 1:
+            with stage('QuantileNormalize.filter', [data]):
+                out = None
+                if self.reuse_buffers:
+                    data = numpy.asanyarray(data)
+                    out = self._get_buffer('filtered', (data.size,),
+                                           numpy.ma.getdata(data).dtype)
+                self._filtered_data = self._filter_data(
+                    data, *self._filter_range, out=out)
+            with stage('QuantileNormalize.quantile', [self._filtered_data]):
+                self.quantile = self._calc_quantile(self._filtered_data,
+                                                    self.qs)
+        else:
+            self._filtered_data = None
+            chunksize = self.block_size
+            if n_workers > 1:
+                # A few tasks per worker:
+                chunksize = max(chunksize,
+                                -(-numpy.size(data) // (4 * n_workers)))
+            self._fit_estimator(self.estimator or 'kll',
+                                iterchunks(data, chunksize))
+        self._set_vmin_vmax()
+        self._release_data()
+
+    def _autoscale_weighted(self, data):
+        if self.estimator is not None:
+            raise ValueError('weights are not supported with estimator')
+        with stage('QuantileNormalize.filter', [data]):
+            values, weights = self._filter_weighted(data, self.weights,
+                                                    *self._filter_range)
+        with stage('QuantileNormalize.quantile', [values]):
+            order = numpy.argsort(values, kind='mergesort')
+            values = values[order]
+            weights = weights[order]
+            qs = self._as_qs_array(self.qs, values.size)
+            self.quantile = weighted_quantile(values, weights, qs,
+                                              presorted=True)
+            self._summary = CDFSummary.from_weighted(
+                values, weights, self.summary_size, presorted=True)
+        self._filtered_data = values
+
+    @staticmethod
+    def _filter_weighted(data, weights, vmin, vmax):
+        data = numpy.asanyarray(data)
+        values = numpy.ma.getdata(data).reshape(-1)
+        weights = numpy.asarray(weights, dtype=float)
+        if weights.size == values.size:
+            weights = weights.reshape(-1)
+        else:
+            weights = numpy.broadcast_to(weights, data.shape).reshape(-1)
+        keep = numpy.isfinite(values) & (weights > 0)
+        if numpy.ma.is_masked(data):
+            keep &= ~numpy.ma.getmaskarray(data).reshape(-1)
+        if vmin is not None:
+            keep &= values >= vmin
+        if vmax is not None:
+            keep &= values <= vmax
+        return values[keep], weights[keep]
+
+    def _release_data(self):
+        if not self.keep_data:
+            self.summary  # make sure it is computed
+            self._raw_data = None
+            self._filtered_data = None
+
+    def autoscale_chunked(self, data, chunksize=None):
+        """
+        Set quantiles from `data` processed chunk by chunk.
+
+        Unlike `autoscale`, no copy of the whole (filtered) data is
+        made.  Use this method to prepare a norm for data larger than
+        memory before passing it to plotting functions.  If `estimator`
+        is None, `.KLLSketch` is used since the exact estimator has to
+        hold all values in memory.
+
+        Parameters
+        ----------
+        data : array-like or iterable of array-likes
+            Anything accepted by `.utils.iterchunks`; e.g.,
+            `numpy.memmap`, HDF5/zarr datasets or an iterable of
+            blocks.
+        chunksize : int
+            Number of elements processed at once.  Defaults to
+            `block_size`.
+
+        """
+        if chunksize is None:
+            chunksize = self.block_size
+        self._reset_state()
+        self._raw_data = data if hasattr(data, 'shape') else None
+        self._filtered_data = None
+        self._filter_range = (self.vmin, self.vmax)
+        self._fit_estimator(self.estimator or 'kll',
+                            iterchunks(data, chunksize))
+        self._set_vmin_vmax()
+        self._release_data()
+        return self
+
+    def _n_workers(self):
+        return worker_count(self.n_jobs)
+
+    def _fit_blocks(self, estimator, blocks):
+        est = make_estimator(estimator, **self.estimator_kw)
+        for block in blocks:
+            est.update(self._filter_data(block, *self._filter_range))
+        return est
+
+    def _fit_parallel(self, estimator, chunks, n_workers):
+        def fit_chunk(chunk):
+            return self._fit_blocks(estimator,
+                                    iterchunks(chunk, self.block_size))
+
+        est = make_estimator(estimator, **self.estimator_kw)
+        # Merge results in order so that the outcome is deterministic:
+        for part in map_ordered(fit_chunk, chunks, n_workers):
+            est.merge(part)
+        return est
+
+    @profiled('QuantileNormalize.fit_estimator')
+    def _fit_estimator(self, estimator, chunks):
+        n_workers = self._n_workers()
+        if n_workers > 1:
+            est = self._fit_parallel(estimator, chunks, n_workers)
+        else:
+            est = self._fit_blocks(estimator, chunks)
+        self.quantile = est.quantile(self._as_qs_array(self.qs, est.count))
+        self._summary = CDFSummary.from_estimator(est, self.summary_size)
+        self.estimator_state = est
+
+    def fit(self, data):
+        """
+        Fit quantiles to `data` from scratch and return `self`.
+
+        A fitted norm can be passed as `norm` to many plotting
+        functions (e.g., ``ah.imshow(frame, norm=norm)``) which then
+        share the color scale without re-computing the quantiles.
+        """
+        self._reset_state()
+        self.quantile = None
+        self._raw_data = None
+        return self.partial_fit(data)
+
+    def _reset_state(self):
+        # Forget the data of the previous fits and updates:
+        self.estimator_state = None
+        self._seed = None
+        self._summary = None
+        self._batches = []
+
+    def partial_fit(self, data):
+        """
+        Fold `data` into the quantile state and return `self`.
+
+        It can be called many times (e.g., once per panel) to fit the
+        union of the data.  The data itself is not kept; the CDF panel
+        is drawn from `summary`.
+        """
+        state = self._get_state()
+        for block in iterchunks(data, self.block_size):
+            state.update(self._filter_data(block, *self._init_range))
+        return self._refresh()
+
+    def merge(self, *others):
+        """
+        Merge quantile states of `others` into this norm and return `self`.
+
+        Each of `others` is a `QuantileNormalize` (or its
+        `estimator_state`) fitted to other parts of the dataset,
+        possibly in other processes.  States of the same estimator type
+        are required; use a mergeable sketch (``estimator='kll'``) to
+        keep the size of the pickled state bounded.
+        """
+        state = self._get_state()
+        others = [other._get_state()
+                  if isinstance(other, QuantileNormalize) else other
+                  for other in others]
+        for other in others:
+            if type(other) is not type(state):
+                raise ValueError(
+                    'Cannot merge quantile states of different estimators:'
+                    ' {} and {}'.format(type(state).__name__,
+                                        type(other).__name__))
+        for other in others:
+            state.merge(other)
+        return self._refresh()
+
+    def _get_state(self):
+        if self.estimator_state is None:
+            if self.weights is not None:
+                raise ValueError('Quantile state is not available for a'
+                                 ' norm with `weights`; call autoscale'
+                                 ' with the whole data instead.')
+            state = make_estimator(self.estimator or 'exact',
+                                   **self.estimator_kw)
+            if self._raw_data is not None:
+                # Scaled by the exact path of autoscale
+                state.update(self.filtered_data)
+            elif self._summary is not None:
+                # Scaled by the exact path with keep_data=False; the
+                # summary stands in for the released data:
+                self._seed = self._summary.to_sample()
+            elif self.scaled():
+                raise ValueError('Quantile state is not available for a'
+                                 ' norm created only with `quantile`.')
+            self.estimator_state = state
+        return self.estimator_state
+
+    def _seeded_state(self):
+        state = self._get_state()
+        if self._seed is None:
+            return state
+        return WeightedSample([self._seed, state], [1.0, 1.0])
+
+    def update(self, data):
+        """
+        Incrementally fold new `data` into the quantiles.
+
+        Each call adds a batch fitted by `estimator` (defaulting to
+        `.KLLSketch`) and the quantiles are computed from the batches
+        and the `summary` of the initial fit, so that the memory and
+        the time per call do not grow with the number of calls.
+        Without `window` and `decay`, all batches are merged into one.
+        Otherwise, only the recent batches are used:
+
+        - `window`: only the last `window` batches are used.
+        - `decay`: a batch added ``k`` updates ago is weighted by
+          ``decay ** k``; batches with weight below `min_weight` are
+          dropped.
+
+        Use `partial_fit` to fold data into the exact quantiles.
+        """
+        if self.weights is not None:
+            raise ValueError('Incremental updates are not supported for a'
+                             ' norm with `weights`; call autoscale with'
+                             ' the whole data instead.')
+        if not self._batches and (self._raw_data is not None or
+                                  self._summary is not None or
+                                  self.estimator_state is not None):
+            # The initial fit is represented by its summary:
+            self._batches.append(self.summary.to_sample())
+        if self.window is None and self.decay is None:
+            if not self._batches or \
+                    isinstance(self._batches[-1], WeightedSample):
+                self._batches.append(make_estimator(
+                    self.estimator or 'kll', **self.estimator_kw))
+            state = self._batches[-1]
+            for block in iterchunks(data, self.block_size):
+                state.update(self._filter_data(block, *self._init_range))
+            return self._refresh(WeightedSample(self._batches,
+                                                [1.0] * len(self._batches)))
+        state = make_estimator(self.estimator or 'kll', **self.estimator_kw)
+        for block in iterchunks(data, self.block_size):
+            state.update(self._filter_data(block, *self._init_range))
+        self._batches.append(state)
+        if self.window is not None:
+            del self._batches[:-self.window]
+        if self.decay is None:
+            weights = [1.0] * len(self._batches)
+        else:
+            n = len(self._batches)
+            weights = [self.decay ** (n - 1 - i) for i in range(n)]
+            while weights[0] < self.min_weight:
+                del self._batches[0]
+                del weights[0]
+        return self._refresh(WeightedSample(self._batches, weights))
+
+    def _refresh(self, state=None):
+        if state is None:
+            state = self._seeded_state()
+        self._raw_data = None
+        self._filtered_data = None
+        self._filter_range = self._init_range
+        self.vmin, self.vmax = self._init_range
+        self.quantile = state.quantile(self._as_qs_array(self.qs,
+                                                         state.count))
+        self._summary = CDFSummary.from_estimator(state, self.summary_size)
         self._set_vmin_vmax()
+        return self
+
+    @property
+    def summary(self):
+        """
+        `.CDFSummary` of the data used in the last `autoscale`.
+
+        If the data is not available (e.g., the norm is created with
+        `quantile`), it is a summary of the quantile table.
+        """
+        if self._summary is None:
+            if self._raw_data is not None:
+                self._summary = CDFSummary.from_values(self.filtered_data,
+                                                       self.summary_size)
+            elif self.scaled():
+                qs = self.qs
+                if qs is None or numpy.isscalar(qs):
+                    qs = numpy.linspace(0, 1, len(self.quantile))
+                return CDFSummary(self.quantile, qs)
+            else:
+                raise ValueError('Norm is not scaled yet.')
+        return self._summary
+
+    @property
+    def fitted_range(self):
+        """
+        ``(min, max)`` of the data used in the last fit.
+
+        It is read from the stored statistics (the ends of `quantile`
+        or `summary`) without scanning the data again.  Values outside
+        of the range `vmin`--`vmax` given at construction are not
+        included as they are filtered out before fitting.
+        """
+        if self._summary is None:
+            qs = self._as_qs_array(self.qs, len(self.quantile))
+            if self._raw_data is None or (qs[0] == 0 and qs[-1] == 1):
+                return (self.quantile[0], self.quantile[-1])
+        return (self.summary.min, self.summary.max)
+
+    @property
+    def filtered_data(self):
+        """
+        Finite values of the data used in the last `autoscale`.
+        """
+        if self._filtered_data is None:
+            if self._raw_data is None:
+                raise ValueError('Original data is not available.')
+            self._filtered_data = self._filter_data(self._raw_data,
+                                                    *self._filter_range)
+        return self._filtered_data
+
+    def save(self, file):
+        """
+        Save the fitted state to `file` in `numpy.savez` format.
+
+        The quantile table, `vmin`, `vmax`, `clip` and `summary` are
+        saved; the data and `estimator_state` are not.  Use `load` to
+        restore it.
+        """
+        if not self.scaled():
+            raise ValueError('Norm is not scaled yet.')
+        summary = self.summary
+        qs = self.qs
+        if qs is None or numpy.isscalar(qs):
+            qs = numpy.linspace(0, 1, len(self.quantile))
+        numpy.savez(
+            file,
+            quantile=self.quantile,
+            qs=qs,
+            vmin=self.vmin,
+            vmax=self.vmax,
+            clip=bool(self.clip),
+            summary_xs=summary.xs,
+            summary_ps=summary.ps,
+            summary_count=-1 if summary.count is None else summary.count,
+        )
+
+    @classmethod
+    def load(cls, file, **kwargs):
+        """
+        Load a norm saved by `save`.
+
+        Keyword arguments are passed to the constructor (e.g., to set
+        `interpolate` or `lut_size`); the saved state takes precedence.
+        """
+        with numpy.load(file) as npz:
+            count = npz['summary_count'].item()  # total weight may be float
+            summary = CDFSummary(npz['summary_xs'], npz['summary_ps'],
+                                 None if count < 0 else count)
+            kwargs = dict(kwargs)
+            kwargs.update(
+                quantile=npz['quantile'],
+                qs=npz['qs'],
+                vmin=float(npz['vmin']),
+                vmax=float(npz['vmax']),
+                clip=bool(npz['clip']),
+            )
+        norm = cls(**kwargs)
+        norm._summary = summary
+        return norm
 
     def _set_vmin_vmax(self):
         if self.vmin is None:
@@ -86,23 +760,56 @@ class QuantileNormalize(colors.Normalize):
             self.vmax = self.quantile[-1]
 
     @staticmethod
-    def _calc_quantile(data, qs):
+    def _as_qs_array(qs, size):
         if qs is None:
-            qs = min(data.size, 100)
+            qs = int(min(size, 100))
         if numpy.isscalar(qs):
             qs = numpy.linspace(0, 1, qs + 1)
             # "+ 1" so that each element is a multiple of `1/qs`.
+        return numpy.asarray(qs)
 
+    @classmethod
+    def _calc_quantile(cls, data, qs):
+        qs = cls._as_qs_array(qs, data.size)
         return numpy.nanpercentile(data, qs * 100)
 
     @staticmethod
-    def _filter_data(data, vmin, vmax):
-        data = finitevalues(data)
-        if vmin is not None:
-            data = data[data >= vmin]
-        if vmax is not None:
-            data = data[data <= vmax]
-        return data
+    def _filter_data(data, vmin, vmax, out=None):
+        return filtered_values(data, vmin, vmax, out=out)
+
+
+# Does not depend on the norm; shared by all colorbars of the original
+# (normalized) scale:
+_ORIGINAL_GRADIENT = numpy.vstack([numpy.linspace(1, 0, 256)] * 2).T
+_ORIGINAL_GRADIENT.flags.writeable = False
+
+
+def _guide_segments(values, orientation):
+    values = numpy.asarray(values, dtype=float)
+    ends = numpy.empty((len(values), 2, 2))
+    if orientation == 'horizontal':
+        ends[:, :, 0] = [0, 1]
+        ends[:, :, 1] = values[:, None]
+    else:
+        ends[:, :, 0] = values[:, None]
+        ends[:, :, 1] = [0, 1]
+    return ends
+
+
+def _guide_lines(ax, values, orientation, color):
+    """
+    Add lines spanning `ax` at `values` as one `LineCollection`.
+
+    It is a vectorized version of `Axes.axhline` and `Axes.axvline`.
+    """
+    if orientation == 'horizontal':
+        transform = ax.get_yaxis_transform()
+    else:
+        transform = ax.get_xaxis_transform()
+    lines = LineCollection(_guide_segments(values, orientation),
+                           colors=color, transform=transform)
+    ax.add_collection(lines, autolim=False)
+    return lines
 
 
 class XYZQRelation(object):
@@ -110,29 +817,71 @@ class XYZQRelation(object):
     def __init__(self, ah):
         self.ah = ah
 
+    def _resolve(self, x, y):
+        x, y = numpy.broadcast_arrays(numpy.ravel(x), numpy.ravel(y))
+        z = numpy.ma.filled(numpy.ma.asarray(self.ah.z_at(x, y), dtype=float),
+                            numpy.nan)
+        p = numpy.ma.filled(self.ah.norm(z), numpy.nan)
+        return x, y, z, p
+
     def plot(self, x, y, marker='o', color='k', noline=False):
+        """
+        Plot markers and guide lines relating ``(x, y)`` to z and q.
+
+        `x` and `y` may be arrays of the same shape.  In that case, all
+        points are resolved by one vectorized `AdaptiveHeatmap.z_at`
+        call and drawn as a single artist per axes and kind (markers
+        or guide lines).
+        """
         self.lines = lines = []
+        self.guides = []
         ah = self.ah
-        z = ah.z_at(x, y)
-        p = ah.norm(z)
+        x, y, z, p = self._resolve(x, y)
 
         marker_kw = dict(
             marker=marker,
-            color=color
+            color=color,
+            linestyle='none',
         )
-
-        lines.extend(ah.ax_main.plot(x, y, **marker_kw))
-        lines.extend(ah.ax_cdf.plot(z, p, **marker_kw))
+        half = numpy.full(len(z), 0.5)
+
+        self.markers = [
+            ah.ax_main.plot(x, y, **marker_kw)[0],
+            ah.ax_cdf.plot(z, p, **marker_kw)[0],
+            ah.cax_quantile.plot(z, half, **marker_kw)[0],
+            ah.cax_original.plot(half, p, **marker_kw)[0],
+        ]
+        lines.extend(self.markers[:2])
         if not noline:
-            lines.append(ah.ax_cdf.axhline(p, color=color))
-            lines.append(ah.ax_cdf.axvline(z, color=color))
-            lines.append(ah.cax_quantile.axvline(z, color=color))
-            lines.append(ah.cax_original.axhline(p, color=color))
-        lines.extend(ah.cax_quantile.plot(z, 0.5, **marker_kw))
-        lines.extend(ah.cax_original.plot(0.5, p, **marker_kw))
+            self.guides = [
+                _guide_lines(ah.ax_cdf, p, 'horizontal', color),
+                _guide_lines(ah.ax_cdf, z, 'vertical', color),
+                _guide_lines(ah.cax_quantile, z, 'vertical', color),
+                _guide_lines(ah.cax_original, p, 'horizontal', color),
+            ]
+            lines.extend(self.guides)
+        lines.extend(self.markers[2:])
 
         return self
 
+    def update(self, x, y):
+        """
+        Move the plotted markers and guide lines to new ``(x, y)``.
+
+        It is cheaper than `remove` followed by `plot` since the
+        artists are reused.
+        """
+        x, y, z, p = self._resolve(x, y)
+        half = numpy.full(len(z), 0.5)
+        for line, data in zip(self.markers,
+                              [(x, y), (z, p), (z, half), (half, p)]):
+            line.set_data(*data)
+        for lines, values, orientation in zip(
+                self.guides, [p, z, z, p],
+                ['horizontal', 'vertical', 'vertical', 'horizontal']):
+            lines.set_segments(_guide_segments(values, orientation))
+        return self
+
     def get_artists(self):
         return self.lines
 
@@ -142,31 +891,102 @@ class XYZQRelation(object):
 
 
 class AHEventHandler(object):
+    """
+    Relate a point clicked in `AdaptiveHeatmap.ax_main` to other panels.
 
-    def __init__(self, ah):
+    Parameters
+    ----------
+    ah : AdaptiveHeatmap
+    blit : bool
+        If True, the static background of each axes is cached on every
+        full draw and only the markers and lines are redrawn (blitted)
+        on a click, instead of re-rendering the whole figure.
+    hover : bool
+        If True, the markers also follow the mouse cursor over
+        `AdaptiveHeatmap.ax_main` (``motion_notify_event``).  It should
+        be combined with `blit` to stay responsive.
+
+    """
+
+    def __init__(self, ah, blit=False, hover=False):
         self.ah = ah
+        self.blit = blit
+        self.hover = hover
+        self._backgrounds = None
+
+    @property
+    def axes(self):
+        ah = self.ah
+        return [ah.ax_main, ah.ax_cdf, ah.cax_quantile, ah.cax_original]
 
     def connect(self):
-        self.ah.figure.canvas.mpl_connect('button_press_event', self.onclick)
+        canvas = self.ah.figure.canvas
+        canvas.mpl_connect('button_press_event', self.onclick)
+        if self.blit:
+            canvas.mpl_connect('draw_event', self.ondraw)
+        if self.hover:
+            canvas.mpl_connect('motion_notify_event', self.onclick)
 
     def onclick(self, event):
         if event.inaxes is self.ah.ax_main:
             self.redraw_xyzq(event.xdata, event.ydata)
 
+    def ondraw(self, event):
+        canvas = self.ah.figure.canvas
+        self._backgrounds = [canvas.copy_from_bbox(ax.bbox)
+                             for ax in self.axes]
+        self._blit_xyzq()
+
+    def _can_blit(self):
+        return self.blit and getattr(self.ah.figure.canvas,
+                                     'supports_blit', True)
+
     def redraw_xyzq(self, x, y):
-        try:
-            xyzq = self.xyzq
-        except AttributeError:
-            pass
-        else:
+        xyzq = getattr(self, 'xyzq', None)
+        if xyzq is not None and self._can_blit():
+            xyzq.update(x, y)
+            self._blit_xyzq()
+            return
+        if xyzq is not None:
             xyzq.remove()
 
+        if not self._can_blit():
+            try:
+                self.xyzq = self.ah.relate_xyzq(x, y)
+            except NotImplementedError:
+                return
+            self.ah.figure.canvas.draw()
+            return
+
+        limits = [(ax.get_xlim(), ax.get_ylim()) for ax in self.axes]
         try:
             self.xyzq = self.ah.relate_xyzq(x, y)
         except NotImplementedError:
             return
-
-        self.ah.figure.canvas.draw()
+        finally:
+            # The cached backgrounds are valid only if the view is
+            # not changed by the auxiliary markers:
+            for ax, (xlim, ylim) in zip(self.axes, limits):
+                ax.set_xlim(xlim)
+                ax.set_ylim(ylim)
+        for art in self.xyzq.get_artists():
+            art.set_animated(True)
+        self._blit_xyzq()
+
+    def _blit_xyzq(self):
+        xyzq = getattr(self, 'xyzq', None)
+        if xyzq is None:
+            return
+        canvas = self.ah.figure.canvas
+        if self._backgrounds is None:
+            canvas.draw()  # ondraw caches backgrounds and calls back
+            return
+        for bg in self._backgrounds:
+            canvas.restore_region(bg)
+        for art in xyzq.get_artists():
+            art.axes.draw_artist(art)
+        for ax in self.axes:
+            canvas.blit(ax.bbox)
 
 
 class AdaptiveHeatmap(object):
@@ -204,6 +1024,8 @@ class AdaptiveHeatmap(object):
             The ratio of the width of `.cax_quantile` to `.ax_main`.
         ax_cdf_width_ratio : float
             The ratio of the width of `.ax_quantile` to `.ax_main`.
+        **kwargs
+            Passed to `AdaptiveHeatmap`.
 
         """
         gs = gridspec.GridSpec(
@@ -211,6 +1033,8 @@ class AdaptiveHeatmap(object):
             height_ratios=[1, cax_original_height_ratio],
             width_ratios=[1, cax_quantile_width_ratio, ax_cdf_width_ratio])
         if figure is None:
+            # Import pyplot lazily to avoid selecting backend at import:
+            from matplotlib import pyplot
             figure = pyplot.figure()
 
         cax_kw = dict(
@@ -223,12 +1047,29 @@ class AdaptiveHeatmap(object):
         cax_original = figure.add_subplot(gs[0, 1], sharey=ax_cdf, **cax_kw)
 
         return cls(ax_main, ax_cdf, cax_quantile, cax_original,
-                   gs=gs)
+                   gs=gs, **kwargs)
 
     def __init__(self, ax_main, ax_cdf, cax_quantile, cax_original,
-                 gs=None):
+                 gs=None, cdf_resolution=None, blit=False, hover=False,
+                 events=True):
         """
         Create an `AdaptiveHeatmap` from pre-existing axes.
+
+        Parameters
+        ----------
+        cdf_resolution : None, int or 'auto'
+            Passed to `.cumhist` as `resolution` when plotting the CDF
+            in `.ax_cdf`.  None (default) plots every data point.  Use
+            ``'auto'`` to reduce the number of vertices down to the
+            pixel resolution of `.ax_cdf` for large data.
+        blit, hover : bool
+            Passed to `AHEventHandler`.  Use ``blit=True`` to redraw
+            only the markers on click and ``hover=True`` to let them
+            follow the mouse cursor.
+        events : bool
+            If False, no event handler is connected and
+            `.event_handler` is None.  Use it for headless rendering
+            (e.g., `.batch.render_all`).
         """
         self.ax_main = ax_main
         self.ax_cdf = ax_cdf
@@ -236,9 +1077,64 @@ class AdaptiveHeatmap(object):
         self.cax_original = cax_original
         self.figure = ax_main.figure
         self.gs = gs
+        self.cdf_resolution = cdf_resolution
 
-        self.event_handler = AHEventHandler(self)
-        self.event_handler.connect()
+        if events:
+            self.event_handler = AHEventHandler(self, blit=blit, hover=hover)
+            self.event_handler.connect()
+        else:
+            self.event_handler = None
+        self._gradient = (None, None)
+        self.pyramid_image = None
+        self.view_norm = None
+
+    def reset(self):
+        """
+        Remove the plotted artists so that the panels can be reused.
+
+        The axes, their tick locators and formatters and the layout are
+        kept, which is cheaper than creating a new figure by `make`
+        for each dataset in a batch job.  Call `plot_all` (or
+        `plot_main` and `plot_sub`) afterwards.
+        """
+        # Before resetting the limits, which would trigger them:
+        self._disconnect_views()
+        axes = [self.ax_main, self.ax_cdf, self.cax_quantile,
+                self.cax_original]
+        for ax in axes:
+            for art in (list(ax.images) + list(ax.lines) +
+                        list(ax.collections) + list(ax.patches) +
+                        list(ax.texts)):
+                art.remove()
+            # Limits (and inversion, e.g., by imshow) are recalculated
+            # from the next data:
+            ax.set_xlim(0, 1)
+            ax.set_ylim(0, 1)
+        # Setting limits turns off autoscaling of shared axes as well,
+        # so it has to be turned on after all limits are reset:
+        for ax in axes:
+            ax.relim()
+            ax.set_autoscale_on(True)
+            ax.set_prop_cycle(None)  # restart the color cycle
+        self.ax_main.set_aspect('auto')
+        self.ax_main.set_title('')
+        self.set_xlabel('')
+        self.set_ylabel('')
+        self.set_zlabel('')
+        if self.event_handler is not None:
+            self.event_handler.xyzq = None
+            self.event_handler._backgrounds = None
+        self.result = None
+        self._mesh_index = None
+
+    def _disconnect_views(self):
+        # Callbacks on the view limits of ax_main bound to the previous
+        # plot (see imshow_pyramid and follow_view):
+        for name in ('pyramid_image', 'view_norm'):
+            follower = getattr(self, name)
+            if follower is not None:
+                follower.disconnect()
+                setattr(self, name, None)
 
     @property
     def mappable(self):
@@ -248,11 +1144,30 @@ class AdaptiveHeatmap(object):
         return mbl
 # https://matplotlib.org/api/_as_gen/matplotlib.pyplot.hist2d.html
 
+    @profiled('AdaptiveHeatmap.plot_main',
+              lambda self, name, *args, **_: args)
     def plot_main(self, name, *args, **kwargs):
         norm = kwargs.pop('norm', None)
         norm_kw = kwargs.pop('norm_kw', {})
+        weights = kwargs.pop('norm_weights', None)
+        if weights is not None and norm is not None:
+            # The norm may be shared with other plots (see `fit`):
+            raise ValueError('norm_weights cannot be used with norm;'
+                             ' set QuantileNormalize.weights instead')
         if norm is None:
             norm_kw = dict(norm_kw)
+            if weights is not None:
+                if 'weights' in norm_kw:
+                    raise ValueError('norm_weights passed as a keyword'
+                                     ' argument but weights exists in'
+                                     ' norm_kw')
+                if not isinstance(weights, str):
+                    norm_kw['weights'] = weights
+                    weights = None
+                elif weights not in ('area', 'counts'):
+                    raise ValueError("norm_weights must be 'area', 'counts'"
+                                     " or an array; got {!r}"
+                                     .format(weights))
             for key in ('vmin', 'vmax'):
                 if key in kwargs:
                     if key in norm_kw:
@@ -267,16 +1182,55 @@ class AdaptiveHeatmap(object):
 
         f = getattr(self.ax_main, name)
         self.result = f(*args, norm=norm, **kwargs)
+        if weights is not None:
+            self._refit_weighted(weights)
         return self.result
 
+    def _refit_weighted(self, kind):
+        # Weights derived from the plotted artist are only known after
+        # plotting, so the norm created by plot_main is fitted again:
+        mappable = self.mappable
+        weights = self._weights_from(mappable, kind)
+        if weights is None:
+            return
+        norm = self.norm
+        norm.weights = weights
+        norm.vmin, norm.vmax = norm._init_range
+        norm.autoscale(mappable.get_array())
+        mappable.changed()
+
+    @staticmethod
+    def _weights_from(mappable, kind):
+        if kind == 'counts':
+            return numpy.ma.getdata(mappable.get_array())
+        if hasattr(mappable, 'get_coordinates'):  # pcolormesh and pcolor
+            xy = mappable.get_coordinates()
+            d1 = xy[1:, 1:] - xy[:-1, :-1]
+            d2 = xy[1:, :-1] - xy[:-1, 1:]
+            return 0.5 * numpy.abs(d1[..., 0] * d2[..., 1] -
+                                   d1[..., 1] * d2[..., 0])
+        if isinstance(mappable, PolyCollection):  # pcolor (matplotlib < 3.8)
+            areas = []
+            for path in mappable.get_paths():
+                x, y = path.vertices.T
+                areas.append(0.5 * abs(numpy.dot(x, numpy.roll(y, 1)) -
+                                       numpy.dot(y, numpy.roll(x, 1))))
+            return numpy.array(areas)
+        return None  # images and hexagons have the same area
+
     @property
     def zdata(self):
+        if self.norm._raw_data is None:
+            raise ValueError('Data is not kept by the norm;'
+                             ' use norm.summary instead.')
         return self.norm._raw_data
 
     @property
     def filtered_zdata(self):
-        return self.norm._filtered_data
+        return self.norm.filtered_data
 
+    @profiled('AdaptiveHeatmap.plot_all',
+              lambda self, name, *args, **_: args)
     def plot_all(self, name, *args, **kwargs):
         self.plot_main(name, *args, **kwargs)
         self.plot_sub()
@@ -304,6 +1258,19 @@ class AdaptiveHeatmap(object):
             function.
         norm_kw : dict
             Keyword arguments passed to `QuantileNormalize`.
+        norm_weights : None, 'area', 'counts' or array
+            Weights of the plotted values for the quantiles of the norm
+            and the CDF panel (see `QuantileNormalize.weights`).  It is
+            named so as not to clash with the ``weights`` of
+            `Axes.hist2d` and `Axes.hexbin`, which are passed through.  An
+            array is passed to the norm via `norm_kw`.  ``'area'``
+            and ``'counts'`` are derived from the plotted artist and
+            the norm is refitted after plotting.  It cannot be used
+            with `norm`; set the weights of the norm instead.
+            ``'area'`` weights the cells of `pcolormesh` and `pcolor`
+            by their areas (images and hexagons have equal areas) and
+            ``'counts'`` weights the values by themselves (e.g., bins
+            of `hist2d` and `hexbin` by their counts).
 
         Returns
         -------
@@ -322,20 +1289,143 @@ class AdaptiveHeatmap(object):
 
     del _make_fun
 
+    def imshow_pyramid(self, data, reduce='mean', extent=None, origin=None,
+                       norm=None, norm_kw={}, **kwargs):
+        """
+        Show a very large raster through a level-of-detail pyramid.
+
+        Only the part of the level matching the resolution of
+        `.ax_main` which is visible at the current view is given to
+        `Axes.imshow`; it is updated on zoom and pan by
+        `.pyramid.PyramidImage` (stored as `.pyramid_image`).  The norm
+        and the CDF panel are computed from the whole raster.
+
+        Parameters
+        ----------
+        data : 2D array-like or `.pyramid.RasterPyramid`
+            The raster (e.g., a `numpy.memmap`) or a pre-built pyramid.
+        reduce : {'mean', 'min', 'max'}
+            Passed to `.pyramid.RasterPyramid` if `data` is a raster.
+        extent, origin
+            Of the whole raster as in `Axes.imshow`.
+        norm : QuantileNormalize
+            Defaults to a `QuantileNormalize` fitted to the full
+            resolution data by `.QuantileNormalize.autoscale_chunked`.
+        norm_kw : dict
+            Keyword arguments passed to `QuantileNormalize`.
+            ``keep_data`` defaults to False here.
+        **kwargs
+            Passed to `Axes.imshow`.
+
+        Returns
+        -------
+        image : `matplotlib.image.AxesImage`
+        """
+        import matplotlib
+        from .pyramid import PyramidImage, RasterPyramid
+
+        if isinstance(data, RasterPyramid):
+            pyramid = data
+        else:
+            pyramid = RasterPyramid(data, reduce=reduce)
+        if norm is None:
+            norm_kw = dict(norm_kw)
+            norm_kw.setdefault('keep_data', False)
+            norm = QuantileNormalize(**norm_kw)
+            norm.autoscale_chunked(pyramid.levels[0])
+        if origin is None:
+            origin = matplotlib.rcParams['image.origin']
+        if extent is None:
+            height, width = pyramid.shape
+            extent = (-0.5, width - 0.5, height - 0.5, -0.5)
+            if origin == 'lower':
+                extent = extent[:2] + extent[2:][::-1]
+
+        self.plot_main('imshow', pyramid.levels[-1], extent=extent,
+                       origin=origin, norm=norm, **kwargs)
+        self.plot_sub()
+        # Fix the view to the whole raster; tiles must not change it:
+        self.ax_main.set_xlim(extent[:2])
+        self.ax_main.set_ylim(extent[2:])
+        self.pyramid_image = PyramidImage(self.mappable, pyramid, extent,
+                                          origin)
+        self.pyramid_image.connect()
+        self.pyramid_image.update()
+        return self.result
+
+    def follow_view(self, **kwargs):
+        """
+        Refit the norm to the data in the view of `.ax_main` on zoom/pan.
+
+        The norm, the CDF panel and the colorbars are updated whenever
+        the view limits change, so that local structure is not washed
+        out by the color scale fitted to the whole data.  Keyword
+        arguments are passed to `.zoom.ViewAdaptiveNorm` which is
+        returned and stored as `.view_norm`.  Note that `.norm` is
+        modified in place.
+        """
+        from .zoom import ViewAdaptiveNorm
+        if self.view_norm is not None:
+            self.view_norm.disconnect()
+        self.view_norm = ViewAdaptiveNorm(self, **kwargs)
+        self.view_norm.connect()
+        return self.view_norm
+
+    def plot_binned(self, binned, statistic='count', **kwargs):
+        """
+        Plot points accumulated by a streaming binner.
+
+        A `.binning.Histogram2D` is drawn by `Axes.pcolormesh` as in
+        `Axes.hist2d` and a `.binning.HexBin` by `Axes.hexbin`.
+
+        Parameters
+        ----------
+        binned : `.binning.Histogram2D` or `.binning.HexBin`
+        statistic : {'count', 'sum', 'mean'}
+            See `.binning.Histogram2D.values`.
+        **kwargs
+            Passed to `plot_all` (e.g., `norm_kw` or `cmap`).  With
+            ``norm_weights='counts'``, the bins are weighted by their counts
+            of points whatever `statistic` is.
+
+        Returns
+        -------
+        Whatever the plotting method returns.
+        """
+        args, plot_kw = binned.plot_args(statistic)
+        plot_kw.update(kwargs)
+        if isinstance(plot_kw.get('norm_weights'), str) \
+                and plot_kw['norm_weights'] == 'counts':
+            plot_kw['norm_weights'] = binned.plot_weights(statistic)
+        return self.plot_all(binned.plot_method, *args, **plot_kw)
+
+    @profiled('AdaptiveHeatmap.plot_sub')
     def plot_sub(self):
         self.plot_cdf()
         with undo_xylim(self.ax_cdf):
             self.colorbar_quantile()
             self.colorbar_original()
 
-    def colorbar_quantile(self):
-        zmin = numpy.nanmin(self.zdata)
-        zmax = numpy.nanmax(self.zdata)
-        gradient = self.norm(numpy.linspace(zmin, zmax, 256))
+    def _quantile_gradient(self):
+        norm = self.norm
+        zmin, zmax = norm.fitted_range
+        key = (zmin, zmax, norm.vmin, norm.vmax, norm.clip,
+               norm.interpolate, norm.lut_size,
+               numpy.asarray(norm.quantile).tobytes())
+        if self._gradient[0] == key:
+            return self._gradient[1]
+        gradient = norm(numpy.linspace(zmin, zmax, 256))
         gradient = numpy.vstack((gradient, gradient))
-        self.cax_quantile.imshow(
+        value = (gradient, (zmin, zmax, 0, 1))  # left, right, bottom, top
+        self._gradient = (key, value)
+        return value
+
+    @profiled('AdaptiveHeatmap.colorbar_quantile')
+    def colorbar_quantile(self):
+        gradient, extent = self._quantile_gradient()
+        self.cax_quantile_image = self.cax_quantile.imshow(
             gradient, aspect='auto',
-            extent=(zmin, zmax, 0, 1),  # left, right, bottom, top
+            extent=extent,
             cmap=self.mappable.cmap,
         )
         self.cax_quantile.set_yticks([])  # no yticks
@@ -344,11 +1434,10 @@ class AdaptiveHeatmap(object):
         #     orientation='horizontal',
         # )
 
+    @profiled('AdaptiveHeatmap.colorbar_original')
     def colorbar_original(self):
-        gradient = numpy.linspace(1, 0, 256)
-        gradient = numpy.vstack((gradient, gradient)).T
-        self.cax_original.imshow(
-            gradient, aspect='auto',
+        self.cax_original_image = self.cax_original.imshow(
+            _ORIGINAL_GRADIENT, aspect='auto',
             extent=(0, 1, 0, 1),  # left, right, bottom, top
             cmap=self.mappable.cmap,
         )
@@ -360,8 +1449,21 @@ class AdaptiveHeatmap(object):
         # self.cax_original.yaxis.set_visible(False)  # hide yticks
 # https://matplotlib.org/examples/color/colormaps_reference.html
 
+    def _cdf_data(self):
+        norm = self.norm
+        # Use the summary unless the norm was fitted by the exact path,
+        # to avoid copying and sorting all the data for the CDF line:
+        if (norm._raw_data is None or norm.weights is not None or
+                norm.estimator_state is not None):
+            return norm.summary
+        return self.filtered_zdata
+
+    @profiled('AdaptiveHeatmap.plot_cdf')
     def plot_cdf(self):
-        cumhist(self.filtered_zdata, ax=self.ax_cdf)
+        data = self._cdf_data()
+        with stage('cumhist', [data]):
+            self.cdf_lines = cumhist(data, ax=self.ax_cdf,
+                                     resolution=self.cdf_resolution)
 
         self.ax_cdf.yaxis.tick_right()
         self.ax_cdf.yaxis.set_label_position('right')
@@ -371,6 +1473,62 @@ class AdaptiveHeatmap(object):
 # https://stackoverflow.com/a/26428792
 # https://matplotlib.org/api/_as_gen/matplotlib.axes.Axes.tick_params.html
 
+    def refresh_sub(self, rescale=True):
+        """
+        Update the CDF line and the colorbars in place.
+
+        Call it after the quantiles of `.norm` are changed (e.g., by
+        `.QuantileNormalize.update`).  Unlike `plot_sub`, it reuses
+        the artists created by `plot_sub`.  If `rescale` is False, the
+        limits of `.ax_cdf` are kept as-is (e.g., for blitting).
+        """
+        line = self.cdf_lines[0]
+        line.set_data(*reduced_cdf(self._cdf_data(), ax=self.ax_cdf,
+                                   resolution=self.cdf_resolution))
+
+        gradient, extent = self._quantile_gradient()
+        self.cax_quantile_image.set_data(gradient)
+        self.cax_quantile_image.set_extent(extent)
+        if rescale:
+            zmin, zmax = extent[:2]
+            margin = self.ax_cdf.margins()[0] * (zmax - zmin)
+            self.ax_cdf.set_xlim(zmin - margin, zmax + margin)
+
+    def set_zdata(self, data):
+        """
+        Replace the data shown by `.mappable` (image or mesh).
+        """
+        if hasattr(self.mappable, 'set_data'):
+            self.mappable.set_data(data)
+        elif isinstance(self.mappable, QuadMesh):
+            self.mappable.set_array(numpy.ma.masked_invalid(data))
+        else:
+            raise NotImplementedError(
+                'Cannot replace data of {}'.format(type(self.mappable)))
+
+    def update(self, data, set_data=True):
+        """
+        Fold new `data` into `.norm` and refresh the figure.
+
+        It is meant for live-streaming heatmaps: the quantiles are
+        updated incrementally by `.QuantileNormalize.update` (see its
+        `window` and `decay` options), `data` is shown in `.ax_main`
+        (unless `set_data` is False) and the CDF panel and the
+        colorbars are updated in place by `refresh_sub`.
+        """
+        self.norm.update(data)
+        if set_data:
+            self.set_zdata(data)
+        self.mappable.changed()
+        self.refresh_sub()
+
+    def animate(self, frames, mode='fixed', **kwargs):
+        """
+        Animate a sequence of 2D `frames`.  See `.animation.animate`.
+        """
+        from .animation import animate
+        return animate(self, frames, mode=mode, **kwargs)
+
     def set_xlabel(self, label):
         """ Set x-axis label of `.ax_main`. """
         self.ax_main.set_xlabel(label)
@@ -387,27 +1545,40 @@ class AdaptiveHeatmap(object):
         """ Set "q-axis" label of `.ax_cdf`. """
         self.ax_cdf.set_ylabel(label)
 
+    @property
+    def mesh_index(self):
+        """
+        Spatial index of the `QuadMesh` `.mappable` (built lazily).
+
+        See `.spatial.mesh_index`.
+        """
+        cached = getattr(self, '_mesh_index', None)
+        if cached is None or cached[0] is not self.mappable:
+            index = mesh_index(self.mappable._coordinates)
+            self._mesh_index = cached = (self.mappable, index)
+        return cached[1]
+
     def z_at(self, x, y):
+        """
+        Return z value(s) of `.mappable` at ``(x, y)``.
+
+        `x` and `y` may be scalars or arrays (of the same shape).
+        """
         zs = self.mappable.get_array()
         if zs.ndim == 2 and hasattr(self.mappable, 'get_extent'):
             ny, nx = zs.shape
             left, right, bottom, top = self.mappable.get_extent()
-            ix = int((x - left) / (right - left) * (nx - 1))
+            x = numpy.asarray(x)
+            y = numpy.asarray(y)
+            ix = ((x - left) / (right - left) * (nx - 1)).astype(int)
             if self.mappable.origin == 'upper':
-                iy = int((top - y) / (top - bottom) * (ny - 1))
+                iy = ((top - y) / (top - bottom) * (ny - 1)).astype(int)
             else:
-                iy = int((y - bottom) / (top - bottom) * (ny - 1))
+                iy = ((y - bottom) / (top - bottom) * (ny - 1)).astype(int)
             return zs[iy, ix]
         elif isinstance(self.mappable, QuadMesh):
-            coords = self.mappable._coordinates[1:, 1:, :]
-            point = numpy.array([x, y]).reshape((1, 1, 2))
-            i = abs(coords - point).sum(axis=-1).argmin()  # closest point
-            # assert coords[:, :, 0].size == zs.size
-            return zs[i]
-            # h = self.mappable._meshHeight
-            # w = self.mappable._meshWidth
-            # zs.reshape(h, w)
-            # # https://stackoverflow.com/a/34841871
+            i = self.mesh_index.query(x, y)
+            return numpy.ma.ravel(zs)[i]
         warnings.warn('z value from (x, y)-coordinate cannot be recovered'
                       ' from {}'.format(type(self.mappable)))
         raise NotImplementedError
@@ -0,0 +1,238 @@
+"""
+Opt-in timing and memory instrumentation of the plotting pipeline.
+
+The stages of `.AdaptiveHeatmap` and `.QuantileNormalize` are recorded
+only while a `Profiler` is active; otherwise the instrumentation costs
+one list lookup per call.
+
+>>> import numpy
+>>> from adaptiveheatmap import QuantileNormalize
+>>> with Profiler() as prof:
+...     _ = QuantileNormalize().autoscale(numpy.arange(10.0))
+>>> [(r['name'], r['depth'], r['size']) for r in prof.records]
+... # doctest: +NORMALIZE_WHITESPACE
+[('QuantileNormalize.filter', 1, 10),
+ ('QuantileNormalize.quantile', 1, 10),
+ ('QuantileNormalize.autoscale', 0, 10)]
+
+"""
+
+from contextlib import contextmanager
+import functools
+import threading
+import time
+
+# time.perf_counter is not available in Python 2:
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Stack of active profilers; only the innermost one records.
+_profilers = []
+
+
+def _measure(arrays):
+    size = nbytes = None
+    for a in arrays:
+        if hasattr(a, 'shape') and hasattr(a, 'nbytes'):
+            size = (size or 0) + int(a.size)
+            nbytes = (nbytes or 0) + int(a.nbytes)
+    return size, nbytes
+
+
+class Profiler(object):
+    """
+    Record wall time, array sizes and allocations of pipeline stages.
+
+    Use it as a context manager; the stages run in the thread entering
+    the context are recorded.
+
+    Parameters
+    ----------
+    callback : callable or None
+        Called with each record (a dict) when a stage finishes; e.g.,
+        to forward the measurements to a metrics system.
+    trace_memory : bool
+        If True, `tracemalloc` is used to measure the memory allocated
+        in each stage (numpy reports its array allocations to it).
+        This slows down allocation-heavy code noticeably.  It requires
+        Python 3 and the peaks are only measured in Python 3.9 or later
+        (``'peak'`` is None otherwise).
+
+    Attributes
+    ----------
+    records : list of dict
+        Finished stages in the order they finished (i.e., inner
+        stages come before the enclosing stage).  Each record has the
+        following keys.
+
+        - ``'name'``: name of the stage such as
+          ``'AdaptiveHeatmap.plot_cdf'``.
+        - ``'depth'``: nesting level (0 for the outermost stages).
+        - ``'start'``: `time.perf_counter` (`time.time` in Python 2)
+          at the start.
+        - ``'wall_time'``: elapsed wall time in seconds.
+        - ``'size'``, ``'nbytes'``: total number of elements and bytes
+          of the input arrays (None if unknown).
+        - ``'allocated'``: net change of traced memory in bytes.
+        - ``'peak'``: peak traced memory above the level at the
+          start in bytes.  These two are None unless `trace_memory`.
+
+    """
+
+    def __init__(self, callback=None, trace_memory=False):
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.records = []
+        self._stack = []
+        self._thread = None
+        self._tracemalloc = None
+        self._started_tracing = False
+
+    def __enter__(self):
+        if self.trace_memory:
+            try:
+                import tracemalloc
+            except ImportError:
+                raise ValueError('trace_memory requires tracemalloc'
+                                 ' (Python 3.4 or later)')
+            self._tracemalloc = tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        self._thread = threading.current_thread()
+        _profilers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _profilers.remove(self)
+        if self._started_tracing:
+            self._tracemalloc.stop()
+            self._started_tracing = False
+
+    def _traced_memory(self):
+        # Peaks since the last reset_peak (Python >= 3.9) or None:
+        current, peak = self._tracemalloc.get_traced_memory()
+        if not hasattr(self._tracemalloc, 'reset_peak'):
+            peak = None
+        return current, peak
+
+    def _reset_peak(self):
+        if hasattr(self._tracemalloc, 'reset_peak'):
+            self._tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name, arrays=()):
+        size, nbytes = _measure(arrays)
+        record = dict(name=name, depth=len(self._stack), size=size,
+                      nbytes=nbytes, allocated=None, peak=None)
+        if self.trace_memory:
+            current, peak = self._traced_memory()
+            if self._stack and peak is not None:
+                parent = self._stack[-1]
+                parent['_peak'] = max(parent['_peak'], peak)
+            self._reset_peak()
+            record['_current'] = record['_peak'] = current
+        self._stack.append(record)
+        record['start'] = _clock()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = _clock() - record['start']
+            self._stack.pop()
+            if self.trace_memory:
+                current, peak = self._traced_memory()
+                start = record.pop('_current')
+                record['allocated'] = current - start
+                if peak is not None:
+                    peak = max(record.pop('_peak'), peak)
+                    record['peak'] = peak - start
+                    if self._stack:
+                        parent = self._stack[-1]
+                        parent['_peak'] = max(parent['_peak'], peak)
+                else:
+                    del record['_peak']
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def summary(self):
+        """
+        Aggregate `records` by stage name.
+
+        Returns
+        -------
+        summary : dict
+            Mapping from stage names to dicts with ``'count'`` and the
+            total ``'wall_time'`` (plus ``'allocated'`` and the maximum
+            ``'peak'`` if `trace_memory`).
+        """
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault(record['name'],
+                                       dict(count=0, wall_time=0.0))
+            entry['count'] += 1
+            entry['wall_time'] += record['wall_time']
+            if record['allocated'] is not None:
+                entry['allocated'] = (entry.get('allocated', 0) +
+                                      record['allocated'])
+                if record['peak'] is not None:
+                    entry['peak'] = max(entry.get('peak', 0), record['peak'])
+        return summary
+
+    def report(self):
+        """
+        Format `records` as a table indented by the nesting of stages.
+        """
+        lines = ['{:<40} {:>10} {:>12} {:>12} {:>12}'.format(
+            'stage', 'time [ms]', 'size', 'alloc [B]', 'peak [B]')]
+        for record in sorted(self.records, key=lambda r: r['start']):
+            lines.append('{:<40} {:>10.3f} {:>12} {:>12} {:>12}'.format(
+                '  ' * record['depth'] + record['name'],
+                record['wall_time'] * 1e3,
+                '-' if record['size'] is None else record['size'],
+                '-' if record['allocated'] is None else record['allocated'],
+                '-' if record['peak'] is None else record['peak']))
+        return '\n'.join(lines)
+
+
+def _current():
+    if _profilers:
+        profiler = _profilers[-1]
+        if profiler._thread is threading.current_thread():
+            return profiler
+    return None
+
+
+@contextmanager
+def stage(name, arrays=()):
+    """
+    Record the enclosed block as a stage `name` of the active `Profiler`.
+
+    `arrays` are the inputs whose sizes are recorded.  It does nothing
+    if no `Profiler` is active.
+    """
+    profiler = _current()
+    if profiler is None:
+        yield None
+    else:
+        with profiler.stage(name, arrays) as record:
+            yield record
+
+
+def profiled(name, arrays=None):
+    """
+    Decorate a method so that each call is recorded as a stage `name`.
+
+    `arrays` is a function called with the arguments of the method
+    which returns the input arrays whose sizes are recorded.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _current()
+            if profiler is None:
+                return func(*args, **kwargs)
+            inputs = arrays(*args, **kwargs) if arrays is not None else ()
+            with profiler.stage(name, inputs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
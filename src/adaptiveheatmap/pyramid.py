@@ -0,0 +1,236 @@
+"""
+Level-of-detail pyramid for showing very large rasters.
+"""
+
+import numpy
+
+from .spatial import image_slices
+
+REDUCTIONS = ('mean', 'min', 'max')
+
+
+def _as_float(block):
+    block = numpy.ma.filled(numpy.ma.asanyarray(block).astype(float),
+                            numpy.nan)
+    return block
+
+
+def downsample(data, factor=2, reduce='mean'):
+    """
+    Reduce each ``factor x factor`` block of a 2D array into one pixel.
+
+    Non-finite (and masked) values are ignored; a block without finite
+    values becomes NaN.  Incomplete blocks at the bottom and right
+    edges are reduced from the available pixels.
+
+    >>> downsample(numpy.array([[1, 3, 5], [numpy.nan, 2, 7]]))
+    array([[2., 6.]])
+    >>> downsample(numpy.array([[1, 3, 5], [numpy.nan, 2, 7]]),
+    ...            reduce='max')
+    array([[3., 7.]])
+
+    """
+    if reduce not in REDUCTIONS:
+        raise ValueError('reduce must be one of {}; got {!r}'
+                         .format(REDUCTIONS, reduce))
+    data = _as_float(data)
+    h, w = data.shape
+    h2 = -(-h // factor)
+    w2 = -(-w // factor)
+    if (h2 * factor, w2 * factor) != (h, w):
+        padded = numpy.full((h2 * factor, w2 * factor), numpy.nan)
+        padded[:h, :w] = data
+        data = padded
+    blocks = data.reshape((h2, factor, w2, factor))
+    finite = numpy.isfinite(blocks)
+    if reduce == 'mean':
+        sums = numpy.where(finite, blocks, 0).sum(axis=(1, 3))
+        counts = finite.sum(axis=(1, 3))
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return numpy.where(counts > 0, sums / counts, numpy.nan)
+    fill = numpy.inf if reduce == 'min' else -numpy.inf
+    ufunc = numpy.minimum if reduce == 'min' else numpy.maximum
+    reduced = ufunc.reduce(numpy.where(finite, blocks, fill), axis=(1, 3))
+    reduced[~finite.any(axis=(1, 3))] = numpy.nan
+    return reduced
+
+
+class RasterPyramid(object):
+    """
+    Multi-resolution pyramid of a 2D raster.
+
+    Level 0 is `data` itself (not copied, so that it can be a
+    `numpy.memmap`) and each following level is downsampled by
+    `factor` from the previous one until it fits in
+    ``min_size x min_size``.
+
+    Parameters
+    ----------
+    data : 2D array-like
+    reduce : {'mean', 'min', 'max'}
+        How blocks of pixels are reduced (see `downsample`).  Use
+        ``'max'`` (or ``'min'``) to keep isolated peaks visible when
+        zoomed out.
+    factor : int
+        Downsampling factor between consecutive levels.
+    min_size : int
+        Size of the coarsest level.
+    slab_size : int
+        Approximate number of elements of `data` read at once while
+        building the first downsampled level.
+
+    Attributes
+    ----------
+    levels : list of arrays
+        ``levels[k]`` is downsampled by ``factor ** k``.
+    shape : tuple
+        Shape of `data`.
+
+    """
+
+    def __init__(self, data, reduce='mean', factor=2, min_size=256,
+                 slab_size=2 ** 22):
+        self.reduce = reduce
+        self.factor = factor
+        self.shape = tuple(data.shape)
+        self.levels = [data]
+        while max(self.levels[-1].shape) > min_size:
+            if len(self.levels) == 1:
+                level = self._downsample_slabs(data, slab_size)
+            else:
+                level = downsample(self.levels[-1], factor, reduce)
+            self.levels.append(level)
+
+    def _downsample_slabs(self, data, slab_size):
+        h, w = data.shape
+        rows = max(1, slab_size // max(w, 1) // self.factor) * self.factor
+        return numpy.concatenate([
+            downsample(data[start:start + rows], self.factor, self.reduce)
+            for start in range(0, h, rows)])
+
+    def choose_level(self, nrows, ncols, height, width):
+        """
+        Coarsest level showing ``nrows x ncols`` pixels of level 0 with
+        at least one pixel per screen pixel in ``height x width``.
+        """
+        ratio = min(float(nrows) / max(height, 1),
+                    float(ncols) / max(width, 1))
+        if ratio <= 1:
+            return 0
+        level = int(numpy.floor(numpy.log(ratio) / numpy.log(self.factor)))
+        return min(level, len(self.levels) - 1)
+
+    def tile(self, level, rows, cols):
+        """
+        Cut the region ``rows x cols`` (level 0 slices) from `level`.
+
+        Returns
+        -------
+        tile : 2D array
+        rows, cols : slice
+            The region actually covered by `tile` in level 0 pixels.
+        """
+        scale = self.factor ** level
+        h, w = self.levels[level].shape
+        r0 = min(rows.start // scale, h - 1)
+        c0 = min(cols.start // scale, w - 1)
+        r1 = min(max(-(-rows.stop // scale), r0 + 1), h)
+        c1 = min(max(-(-cols.stop // scale), c0 + 1), w)
+        tile = numpy.asarray(self.levels[level][r0:r1, c0:c1])
+        return (tile, slice(r0 * scale, r1 * scale),
+                slice(c0 * scale, c1 * scale))
+
+
+class PyramidImage(object):
+    """
+    Keep an `AxesImage` showing the visible part of a `RasterPyramid`.
+
+    On every change of the view limits of the axes, the level matching
+    the screen resolution is chosen and only the visible tile of it is
+    set to the image, so that resampling and normalization at draw
+    time are bounded by the size of the axes rather than of the
+    raster.
+
+    Parameters
+    ----------
+    image : matplotlib.image.AxesImage
+    pyramid : RasterPyramid
+    extent : (left, right, bottom, top)
+        Extent of the whole raster as in `Axes.imshow`.
+    origin : {'upper', 'lower'}
+
+    """
+
+    def __init__(self, image, pyramid, extent, origin='upper'):
+        self.image = image
+        self.pyramid = pyramid
+        self.extent = extent
+        self.origin = origin
+        self._current = None
+        self._cids = []
+        self._callbacks = None
+
+    @property
+    def axes(self):
+        return self.image.axes
+
+    def _row_edges(self):
+        left, right, bottom, top = self.extent
+        if self.origin == 'upper':
+            return top, bottom
+        return bottom, top
+
+    def _to_coordinate(self, index, start, end, size):
+        return start + float(index) / size * (end - start)
+
+    def view(self):
+        """
+        Level and level-0 slices of the region visible in the axes.
+        """
+        rows, cols = image_slices(self.extent, self.origin,
+                                  self.pyramid.shape,
+                                  self.axes.get_xlim(), self.axes.get_ylim())
+        bbox = self.axes.get_window_extent()
+        level = self.pyramid.choose_level(
+            rows.stop - rows.start, cols.stop - cols.start,
+            bbox.height, bbox.width)
+        return level, rows, cols
+
+    def update(self, *_):
+        """
+        Set the tile for the current view to the image (if changed).
+        """
+        level, rows, cols = self.view()
+        tile, rows, cols = self.pyramid.tile(level, rows, cols)
+        key = (level, rows.start, rows.stop, cols.start, cols.stop)
+        if key == self._current:
+            return
+        self._current = key
+        height, width = self.pyramid.shape
+        left, right = self.extent[:2]
+        y0, y1 = self._row_edges()
+        xs = [self._to_coordinate(i, left, right, width)
+              for i in (cols.start, cols.stop)]
+        ys = [self._to_coordinate(i, y0, y1, height)
+              for i in (rows.start, rows.stop)]
+        if self.origin == 'upper':
+            ys = ys[::-1]
+        self.image.set_data(tile)
+        self.image.set_extent((xs[0], xs[1], ys[0], ys[1]))
+
+    def connect(self):
+        """
+        Update the image when the view limits of the axes change.
+        """
+        callbacks = self.axes.callbacks
+        self._cids = [callbacks.connect('xlim_changed', self.update),
+                      callbacks.connect('ylim_changed', self.update)]
+        self._callbacks = callbacks
+
+    def disconnect(self):
+        """
+        Stop updating the image on changes of the view limits.
+        """
+        for cid in self._cids:
+            self._callbacks.disconnect(cid)
+        self._cids = []
@@ -0,0 +1,456 @@
+"""
+Quantile estimators used by `.QuantileNormalize`.
+
+An estimator consumes one-dimensional arrays of finite values via
+``update`` (possibly many times), can be combined with another
+estimator of the same type via ``merge``, and answers quantile queries
+via ``quantile``.
+"""
+
+import numpy
+
+
+class ExactQuantile(object):
+    """
+    Exact quantile estimator based on `numpy.nanpercentile`.
+
+    All values passed to `update` are kept in memory so that
+    `quantile` gives the same answer as calling `numpy.nanpercentile`
+    on the concatenation of them.
+
+    >>> est = ExactQuantile()
+    >>> est.update([3.0, 1.0])
+    >>> est.update([2.0])
+    >>> est.quantile([0, 0.5, 1])
+    array([1., 2., 3.])
+
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.count = 0
+
+    def update(self, values):
+        values = numpy.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        self._chunks.append(values)
+        self.count += values.size
+
+    def merge(self, other):
+        self._chunks.extend(other._chunks)
+        self.count += other.count
+        return self
+
+    def values(self):
+        if not self._chunks:
+            return numpy.empty(0)
+        if len(self._chunks) > 1:
+            self._chunks = [numpy.concatenate(self._chunks)]
+        return self._chunks[0]
+
+    def weighted_items(self):
+        """
+        Return sorted values and their (unit) weights.
+        """
+        items = numpy.sort(self.values())
+        return items, numpy.ones(len(items))
+
+    @property
+    def min(self):
+        return self.values().min() if self.count else numpy.nan
+
+    @property
+    def max(self):
+        return self.values().max() if self.count else numpy.nan
+
+    def quantile(self, qs):
+        qs = numpy.asarray(qs, dtype=float)
+        if self.count == 0:
+            return numpy.full(qs.shape, numpy.nan)
+        return numpy.percentile(self.values(), qs * 100)
+
+
+class KLLSketch(object):
+    """
+    Mergeable streaming quantile sketch (KLL).
+
+    The sketch keeps a hierarchy of "compactors".  Items at level ``h``
+    represent ``2 ** h`` original values.  When a level overflows its
+    capacity, it is sorted and every other item (with a random offset)
+    is promoted to the next level.  Memory is bounded by about ``3 * k``
+    floats regardless of the number of values fed to `update`.
+
+    Rank-error guarantee: for a query ``q`` the returned value ``x``
+    satisfies ``|rank(x) / n - q| <= eps`` where ``eps`` is
+    ``O(1 / k)`` with high probability (Karnin, Lang & Liberty, 2016).
+    Empirically ``eps`` is below about 1.7% with 99% confidence for the
+    default ``k = 200`` and it shrinks roughly as ``1 / k``.  The
+    minimum and the maximum are tracked exactly, so ``q = 0`` and
+    ``q = 1`` are always exact.  When fewer than ``k`` values were fed,
+    the sketch holds all of them and every quantile is exact.
+
+    Parameters
+    ----------
+    k : int
+        Accuracy parameter; the capacity of the top-level compactor.
+    seed : None, int or numpy.random.RandomState
+        Random state used to choose the offset of the compactions.
+        It defaults to a fixed seed so that plots are reproducible.
+
+    >>> sketch = KLLSketch(k=50)
+    >>> sketch.update(numpy.arange(100001))
+    >>> sketch.count
+    100001
+    >>> sketch.quantile([0, 1])
+    array([     0., 100000.])
+    >>> bool(abs(sketch.quantile(0.5) - 50000) < 0.05 * 100000)
+    True
+
+    """
+
+    c = 2.0 / 3.0
+
+    def __init__(self, k=200, seed=0):
+        if k < 2:
+            raise ValueError('k must be at least 2; got {}'.format(k))
+        self.k = k
+        if isinstance(seed, numpy.random.RandomState):
+            self._rng = seed
+        else:
+            self._rng = numpy.random.RandomState(seed)
+        self._levels = [numpy.empty(0)]
+        self.count = 0
+        self.min = numpy.nan
+        self.max = numpy.nan
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(2, int(numpy.ceil(self.k * self.c ** depth)))
+
+    def _update_minmax(self, vmin, vmax):
+        if self.count == 0:
+            self.min = vmin
+            self.max = vmax
+        else:
+            self.min = min(self.min, vmin)
+            self.max = max(self.max, vmax)
+
+    def update(self, values):
+        values = numpy.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        self._update_minmax(values.min(), values.max())
+        self.count += values.size
+        self._levels[0] = numpy.concatenate([self._levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        self._update_minmax(other.min, other.max)
+        self.count += other.count
+        while len(self._levels) < len(other._levels):
+            self._levels.append(numpy.empty(0))
+        for h, items in enumerate(other._levels):
+            self._levels[h] = numpy.concatenate([self._levels[h], items])
+        self._compress()
+        return self
+
+    def _compress(self):
+        h = 0
+        while h < len(self._levels):
+            items = self._levels[h]
+            if len(items) > self._capacity(h):
+                if h + 1 == len(self._levels):
+                    self._levels.append(numpy.empty(0))
+                # Levels above 0 consist of a few sorted runs for which
+                # merge sort is fast.
+                items = numpy.sort(items, kind='quicksort' if h == 0
+                                   else 'mergesort')
+                n = len(items) - len(items) % 2
+                offset = self._rng.randint(2)
+                self._levels[h + 1] = numpy.concatenate(
+                    [self._levels[h + 1], items[offset:n:2]])
+                self._levels[h] = items[n:]
+            h += 1
+
+    def weighted_items(self):
+        """
+        Return sorted items and their weights held in the sketch.
+        """
+        items = numpy.concatenate(self._levels)
+        weights = numpy.concatenate([
+            numpy.full(len(level), 2.0 ** h)
+            for h, level in enumerate(self._levels)])
+        order = numpy.argsort(items, kind='mergesort')
+        return items[order], weights[order]
+
+    def quantile(self, qs):
+        qs = numpy.asarray(qs, dtype=float)
+        if self.count == 0:
+            return numpy.full(qs.shape, numpy.nan)
+        items, weights = self.weighted_items()
+        # "Center" rank of each item; equals 0, 1, ..., n - 1 when all
+        # weights are 1 so that this agrees with linear interpolation
+        # used in numpy.percentile.
+        ranks = numpy.cumsum(weights) - (weights + 1) / 2
+        result = numpy.interp(qs * (self.count - 1), ranks, items)
+        result = numpy.where(qs <= 0, self.min, result)
+        result = numpy.where(qs >= 1, self.max, result)
+        return result[()] if result.ndim == 0 else result
+
+
+def weighted_quantile(values, weights, qs, presorted=False):
+    """
+    Quantiles of `values` where each value is counted `weights` times.
+
+    It is computed by a single sort and a cumulative sum of the
+    weights.  Value ``values[i]`` is placed at the cumulative
+    probability at the center of its weight and the quantile function
+    is linearly interpolated between them.  Quantiles at 0 and 1 are
+    the minimum and the maximum values with positive weights.
+
+    >>> weighted_quantile([1.0, 2.0, 3.0], [1, 0, 1], [0, 0.5, 1])
+    array([1., 2., 3.])
+    >>> float(weighted_quantile([1.0, 2.0, 3.0], [1, 2, 1], 0.5))
+    2.0
+
+    """
+    values = numpy.asarray(values, dtype=float).ravel()
+    weights = numpy.asarray(weights, dtype=float).ravel()
+    qs = numpy.asarray(qs, dtype=float)
+    positive = weights > 0
+    values = values[positive]
+    weights = weights[positive]
+    if len(values) == 0:
+        return numpy.full(qs.shape, numpy.nan)
+    if not presorted:
+        order = numpy.argsort(values, kind='mergesort')
+        values = values[order]
+        weights = weights[order]
+    cw = numpy.cumsum(weights)
+    ps = (cw - weights / 2) / cw[-1]
+    result = numpy.interp(qs, ps, values)
+    result = numpy.where(qs <= 0, values[0], result)
+    result = numpy.where(qs >= 1, values[-1], result)
+    return result[()] if result.ndim == 0 else result
+
+
+class WeightedSample(object):
+    """
+    Weighted combination of the states of several quantile estimators.
+
+    It is used for forgetting old data (see
+    `.QuantileNormalize.update`) and supports the read-only part of
+    the estimator interface (`quantile`, `count`, `min` and `max`).
+
+    Parameters
+    ----------
+    estimators : list
+        Estimators with ``weighted_items`` method.
+    weights : list of float
+        Weight of each estimator.
+
+    """
+
+    def __init__(self, estimators, weights):
+        items = []
+        item_weights = []
+        mins = []
+        maxs = []
+        for est, w in zip(estimators, weights):
+            if est.count == 0 or w <= 0:
+                continue
+            i, iw = est.weighted_items()
+            items.append(i)
+            item_weights.append(iw * w)
+            mins.append(est.min)
+            maxs.append(est.max)
+        if items:
+            self.items = numpy.concatenate(items)
+            self.weights = numpy.concatenate(item_weights)
+            self.min = min(mins)
+            self.max = max(maxs)
+        else:
+            self.items = self.weights = numpy.empty(0)
+            self.min = self.max = numpy.nan
+        self.count = self.weights.sum()
+        self._presorted = False
+
+    @classmethod
+    def from_items(cls, items, weights, min, max):
+        """
+        Create a sample from weighted `items` and the exact range.
+
+        The items are sorted once here so that subsequent `quantile`
+        calls only need a cumulative sum.
+        """
+        self = cls([], [])
+        items = numpy.asarray(items, dtype=float).ravel()
+        weights = numpy.asarray(weights, dtype=float).ravel()
+        order = numpy.argsort(items, kind='mergesort')
+        self.items = items[order]
+        self.weights = weights[order]
+        self.min = min
+        self.max = max
+        self.count = self.weights.sum()
+        self._presorted = True
+        return self
+
+    def weighted_items(self):
+        """
+        Return sorted items and their weights.
+        """
+        if self._presorted:
+            return self.items, self.weights
+        order = numpy.argsort(self.items, kind='mergesort')
+        return self.items[order], self.weights[order]
+
+    def quantile(self, qs):
+        result = weighted_quantile(self.items, self.weights, qs,
+                                   presorted=self._presorted)
+        if self.count > 0:
+            # Make sure the range is exact:
+            qs = numpy.asarray(qs)
+            result = numpy.where(qs <= 0, self.min, result)
+            result = numpy.where(qs >= 1, self.max, result)
+            result = result[()] if result.ndim == 0 else result
+        return result
+
+
+class CDFSummary(object):
+    """
+    Compact summary of a one-dimensional distribution.
+
+    Attributes
+    ----------
+    xs : array
+        Sorted knots in the data space.
+    ps : array
+        Cumulative probabilities at `xs`.
+    count : int or None
+        Number of values summarized (None if unknown).
+
+    >>> summary = CDFSummary.from_values(numpy.arange(5.0))
+    >>> summary.xs
+    array([0., 1., 2., 3., 4.])
+    >>> summary.ps
+    array([0.2, 0.4, 0.6, 0.8, 1. ])
+    >>> summary.min, summary.max, summary.count
+    (0.0, 4.0, 5)
+
+    """
+
+    def __init__(self, xs, ps, count=None):
+        self.xs = numpy.asarray(xs, dtype=float)
+        self.ps = numpy.asarray(ps, dtype=float)
+        self.count = count
+
+    @property
+    def min(self):
+        return float(self.xs[0]) if len(self.xs) else numpy.nan
+
+    @property
+    def max(self):
+        return float(self.xs[-1]) if len(self.xs) else numpy.nan
+
+    @classmethod
+    def from_values(cls, values, size=1024):
+        """
+        Summarize finite `values`; exact if there are at most `size`.
+        """
+        values = numpy.asarray(values, dtype=float).ravel()
+        n = len(values)
+        if n <= size:
+            return cls(numpy.sort(values), numpy.arange(1, n + 1) / float(n),
+                       n)
+        ps = numpy.linspace(0, 1, size)
+        return cls(numpy.percentile(values, ps * 100), ps, n)
+
+    @classmethod
+    def from_weighted(cls, values, weights, size=1024, presorted=False):
+        """
+        Summarize finite `values` each counted `weights` times.
+
+        The knots are exact if there are at most `size` values.  The
+        `count` is the total weight.
+
+        >>> summary = CDFSummary.from_weighted([2.0, 1.0], [3, 1])
+        >>> summary.xs, summary.ps, float(summary.count)
+        (array([1., 2.]), array([0.25, 1.  ]), 4.0)
+
+        """
+        values = numpy.asarray(values, dtype=float).ravel()
+        weights = numpy.asarray(weights, dtype=float).ravel()
+        if not presorted:
+            order = numpy.argsort(values, kind='mergesort')
+            values = values[order]
+            weights = weights[order]
+        cw = numpy.cumsum(weights)
+        total = cw[-1] if len(cw) else 0.0
+        if len(values) <= size:
+            return cls(values, cw / total if total else cw, total)
+        ps = numpy.linspace(0, 1, size)
+        return cls(weighted_quantile(values, weights, ps, presorted=True),
+                   ps, total)
+
+    def to_sample(self):
+        """
+        Convert to a `WeightedSample` whose total weight is `count`.
+
+        Each knot is weighted by the probability mass up to it, so that
+        the sample can stand in for the summarized data (e.g., as the
+        initial state of incremental updates).
+
+        >>> sample = CDFSummary([1.0, 2.0], [0.25, 1.0], 4).to_sample()
+        >>> sample.weights, float(sample.count)
+        (array([1., 3.]), 4.0)
+
+        """
+        count = len(self.xs) if self.count is None else self.count
+        weights = numpy.diff(numpy.concatenate([[0], self.ps])) * count
+        return WeightedSample.from_items(self.xs, weights, self.min,
+                                         self.max)
+
+    @classmethod
+    def from_estimator(cls, estimator, size=1024):
+        """
+        Summarize values fed to a quantile `estimator`.
+        """
+        if estimator.count <= size and hasattr(estimator, 'values'):
+            return cls.from_values(estimator.values(), size)
+        ps = numpy.linspace(0, 1, size)
+        return cls(estimator.quantile(ps), ps, estimator.count)
+
+
+ESTIMATORS = {
+    'exact': ExactQuantile,
+    'kll': KLLSketch,
+}
+
+
+def make_estimator(estimator, **kwargs):
+    """
+    Create a quantile estimator.
+
+    Parameters
+    ----------
+    estimator : str or callable
+        One of the keys of `ESTIMATORS` (``'exact'`` or ``'kll'``) or
+        a callable returning an estimator.
+    **kwargs
+        Passed to the estimator constructor.
+
+    >>> make_estimator('kll', k=10).k
+    10
+
+    """
+    if callable(estimator):
+        return estimator(**kwargs)
+    try:
+        factory = ESTIMATORS[estimator]
+    except KeyError:
+        raise ValueError('Unknown estimator: {!r}; must be one of {}'
+                         .format(estimator, sorted(ESTIMATORS)))
+    return factory(**kwargs)
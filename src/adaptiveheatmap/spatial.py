@@ -0,0 +1,368 @@
+"""
+Spatial indices to locate cells of a mesh from ``(x, y)``-coordinates.
+"""
+
+import numpy
+
+
+def _locate(edges, v):
+    """
+    Index of the cell between `edges` containing `v` (clipped).
+
+    >>> _locate(numpy.array([0, 1, 2, 3]), [-1, 0.5, 2, 9])
+    array([0, 0, 2, 2])
+    >>> _locate(numpy.array([3, 2, 1, 0]), [-1, 0.5, 2, 9])
+    array([2, 2, 0, 0])
+
+    """
+    if edges[-1] < edges[0]:
+        return len(edges) - 2 - _locate(edges[::-1], v)
+    i = numpy.searchsorted(edges, v, side='right') - 1
+    return numpy.clip(i, 0, len(edges) - 2)
+
+
+class RectilinearIndex(object):
+    """
+    Locate cells of an axis-aligned mesh by binary search.
+
+    Parameters
+    ----------
+    edges0, edges1 : array
+        Monotonic cell edges along the first and the second axis of
+        the mesh.
+    transposed : bool
+        If False, the first axis runs along y (as in
+        ``pcolormesh(x, y, C)``); if True, it runs along x.
+
+    """
+
+    def __init__(self, edges0, edges1, transposed=False):
+        self.edges0 = numpy.asarray(edges0)
+        self.edges1 = numpy.asarray(edges1)
+        self.transposed = transposed
+        self.shape = (len(self.edges0) - 1, len(self.edges1) - 1)
+
+    def query(self, x, y):
+        """
+        Return flat indices of the cells containing points ``(x, y)``.
+
+        Points outside of the mesh are mapped to the closest cell at
+        the boundary.
+        """
+        v0, v1 = (x, y) if self.transposed else (y, x)
+        i0 = _locate(self.edges0, v0)
+        i1 = _locate(self.edges1, v1)
+        return i0 * self.shape[1] + i1
+
+    def slices(self, xlim, ylim):
+        """
+        Slices along the two axes of the mesh covering the view limits.
+        """
+        v0, v1 = (xlim, ylim) if self.transposed else (ylim, xlim)
+        return (_range_slice(self.edges0, v0), _range_slice(self.edges1, v1))
+
+
+def _range_slice(edges, lim):
+    i0, i1 = sorted(_locate(edges, numpy.asarray(lim, dtype=float)))
+    return slice(int(i0), int(i1) + 1)
+
+
+def image_slices(extent, origin, shape, xlim, ylim):
+    """
+    Rows and columns of an image covering the view limits.
+
+    Parameters
+    ----------
+    extent : (left, right, bottom, top)
+        As in `Axes.imshow`.
+    origin : {'upper', 'lower'}
+    shape : (int, int)
+        Number of rows and columns of the image.
+    xlim, ylim : (float, float)
+        View limits.
+
+    Returns
+    -------
+    rows, cols : slice
+        Non-empty slices clipped to the image.
+
+    Examples
+    --------
+    >>> image_slices((-0.5, 9.5, 4.5, -0.5), 'upper', (5, 10),
+    ...              (2.2, 5.7), (3, 1))
+    (slice(1, 4, None), slice(2, 7, None))
+
+    """
+    left, right, bottom, top = extent
+    y0, y1 = (top, bottom) if origin == 'upper' else (bottom, top)
+    return (_index_range(ylim, y0, y1, shape[0]),
+            _index_range(xlim, left, right, shape[1]))
+
+
+def _index_range(lim, start, end, size):
+    i0, i1 = sorted((v - start) / (end - start) * size for v in lim)
+    i0 = int(numpy.clip(numpy.floor(i0), 0, size - 1))
+    i1 = int(numpy.clip(numpy.ceil(i1), i0 + 1, size))
+    return slice(i0, i1)
+
+
+class CellGridIndex(object):
+    """
+    Nearest-neighbor search over points bucketed into a uniform grid.
+
+    Parameters
+    ----------
+    points : array of shape ``(N, 2)``
+        Coordinates of the points (e.g., centers of mesh cells).
+    bucket_size : int
+        Average number of points per grid cell.
+
+    """
+
+    def __init__(self, points, bucket_size=4):
+        points = numpy.asarray(points, dtype=float).reshape((-1, 2))
+        finite = numpy.isfinite(points).all(axis=1)
+        self.points = points
+        self.ids = numpy.nonzero(finite)[0]
+        valid = points[finite]
+        self.lower = valid.min(axis=0)
+        extent = valid.max(axis=0) - self.lower
+        nbuckets = max(1, len(valid) // bucket_size)
+        # Choose the grid shape so that grid cells are about square.
+        aspect = extent[1] / extent[0] if extent.all() else 1.0
+        nx = int(numpy.clip(numpy.sqrt(nbuckets / aspect), 1, nbuckets))
+        ny = int(max(1, nbuckets // nx))
+        self.gshape = numpy.array([nx, ny])
+        self.csize = numpy.where(extent > 0, extent, 1) / self.gshape
+
+        cell = self._cell(valid)
+        flat = cell[:, 1] * nx + cell[:, 0]
+        order = numpy.argsort(flat, kind='mergesort')
+        self.ids = self.ids[order]
+        self.starts = numpy.searchsorted(flat[order],
+                                         numpy.arange(nx * ny + 1))
+        # Summed-area table of the bucket sizes for counting the points
+        # in a box of buckets in constant time:
+        self._table = numpy.zeros((ny + 1, nx + 1), dtype=int)
+        self._table[1:, 1:] = numpy.diff(self.starts).reshape(
+            (ny, nx)).cumsum(axis=0).cumsum(axis=1)
+
+    def _cell(self, xy):
+        cell = numpy.floor((xy - self.lower) / self.csize).astype(int)
+        return numpy.clip(cell, 0, self.gshape - 1)
+
+    def _gather(self, buckets):
+        """
+        Return the ids of the points in `buckets` and the bucket sizes.
+        """
+        starts = self.starts[buckets]
+        lengths = self.starts[buckets + 1] - starts
+        return self.ids[_ranges(starts, lengths)], lengths
+
+    def _box_count(self, cx, cy, r):
+        # Number of points in the buckets within `r` of (cx, cy):
+        if r < 0:
+            return 0
+        nx, ny = self.gshape
+        x0, x1 = max(cx - r, 0), min(cx + r + 1, nx)
+        y0, y1 = max(cy - r, 0), min(cy + r + 1, ny)
+        s = self._table
+        return s[y1, x1] - s[y0, x1] - s[y1, x0] + s[y0, x0]
+
+    def _box(self, cell, c0, c1, r, point=None, max_d2=numpy.inf):
+        """
+        Return the ids of the points in the buckets from `c0` to `c1`
+        (inclusive and clipped) which are not within ``r - 1`` of `cell`
+        and not farther than `max_d2` (squared) from `point`.
+        """
+        c0 = numpy.maximum(c0, 0)
+        c1 = numpy.minimum(c1, self.gshape - 1)
+        xs, ys = numpy.meshgrid(numpy.arange(c0[0], c1[0] + 1),
+                                numpy.arange(c0[1], c1[1] + 1))
+        keep = numpy.maximum(abs(xs - cell[0]), abs(ys - cell[1])) >= r
+        if point is not None:
+            d2 = 0
+            for v, c, lower, size in zip(point, (xs, ys), self.lower,
+                                         self.csize):
+                lo = lower + c * size
+                d2 = d2 + numpy.maximum(numpy.maximum(lo - v, v - lo - size),
+                                        0) ** 2
+            keep &= d2 <= max_d2
+        return self._gather(ys[keep] * self.gshape[0] + xs[keep])[0]
+
+    def _nearest(self, point, cand, best, best_d2):
+        if len(cand) == 0:
+            return best, best_d2
+        d2 = ((self.points[cand] - point) ** 2).sum(axis=1)
+        d2_min = d2.min()
+        i = cand[d2 == d2_min].min()
+        if (d2_min, i) < (best_d2, best) or best < 0:
+            return i, d2_min
+        return best, best_d2
+
+    def _beyond_d2(self, xy, cells, r):
+        """
+        Squared distance from `xy` to the part of the grid outside of
+        the buckets within ``r - 1`` of `cells`.
+
+        It is a lower bound of the distance to any point found in the
+        rings ``r, r + 1, ...`` around `cells` (infinite if there is no
+        such part of the grid).
+        """
+        xy = numpy.asarray(xy, dtype=float)
+        g0 = self.lower
+        g1 = self.lower + self.gshape * self.csize
+        lo = self.lower + (cells - r + 1) * self.csize
+        hi = self.lower + (cells + r) * self.csize
+        d2 = numpy.full(xy.shape[:-1], numpy.inf)
+        for axis in (0, 1):
+            v = xy[..., axis]
+            w = xy[..., 1 - axis]
+            dw = numpy.maximum(numpy.maximum(g0[1 - axis] - w,
+                                             w - g1[1 - axis]), 0)
+            for exists, a0, a1 in [(lo[..., axis] > g0[axis],
+                                    g0[axis], lo[..., axis]),
+                                   (hi[..., axis] < g1[axis],
+                                    hi[..., axis], g1[axis])]:
+                dv = numpy.maximum(numpy.maximum(a0 - v, v - a1), 0)
+                d2 = numpy.where(exists, numpy.minimum(d2, dv ** 2 + dw ** 2),
+                                 d2)
+        return d2
+
+    def _closest(self, cand, owners, point_xy, size):
+        """
+        Closest candidate per owner (ties broken by the smallest id).
+        """
+        best = numpy.full(size, -1)
+        best_d2 = numpy.full(size, numpy.inf)
+        if len(cand) == 0:
+            return best, best_d2
+        d2 = ((self.points[cand] - point_xy) ** 2).sum(axis=1)
+        order = numpy.lexsort((cand, d2, owners))
+        owners = owners[order]
+        first = numpy.ones(len(order), dtype=bool)
+        first[1:] = owners[1:] != owners[:-1]
+        chosen = order[first]
+        best[owners[first]] = cand[chosen]
+        best_d2[owners[first]] = d2[chosen]
+        return best, best_d2
+
+    def _search(self, point, cell, best, best_d2, r):
+        # Finish the search for a point not resolved within the rings
+        # of buckets below `r` around `cell`.
+        cx, cy = cell
+        inner = self._box_count(cx, cy, r - 1)
+        if best < 0:
+            # Binary search for the first non-empty ring, using that
+            # the number of points within ring k increases with k:
+            lo = r
+            hi = max(cx, cy, self.gshape[0] - cx, self.gshape[1] - cy)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._box_count(cx, cy, mid) > inner:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            best, best_d2 = self._nearest(
+                point, self._box(cell, cell - lo, cell + lo, r), best,
+                best_d2)
+            r = lo + 1
+        if best >= 0 and self._beyond_d2(point, cell, r) < best_d2:
+            # Closer points can only be in the buckets overlapping the
+            # circle through the current best:
+            d = numpy.sqrt(best_d2)
+            best, best_d2 = self._nearest(
+                point, self._box(cell, self._cell(point - d),
+                                 self._cell(point + d), r, point, best_d2),
+                best, best_d2)
+        return best
+
+    def query(self, x, y):
+        """
+        Return indices of the points closest to ``(x, y)``.
+
+        Candidates in the 3 x 3 buckets around the query points are
+        searched at once.  Only the points whose nearest neighbor may
+        be farther away (e.g., outside of a curvilinear mesh) fall back
+        to a per-point search: the first non-empty ring of buckets is
+        found by a binary search over the bucket counts and then the
+        buckets within the distance to the closest point found so far
+        are scanned at once.  Its cost grows with the number of buckets
+        in that distance and the number of points in the buckets
+        overlapping the circle.
+        """
+        xy = numpy.stack(numpy.broadcast_arrays(x, y), axis=-1)
+        flat = xy.reshape((-1, 2)).astype(float)
+        cells = self._cell(flat)
+        nx = self.gshape[0]
+        owners = []
+        cand = []
+        for offset in [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]:
+            c = cells + offset
+            ok = ((c >= 0) & (c < self.gshape)).all(axis=1)
+            ids, lengths = self._gather(c[ok, 1] * nx + c[ok, 0])
+            owners.append(numpy.repeat(numpy.nonzero(ok)[0], lengths))
+            cand.append(ids)
+        owners = numpy.concatenate(owners)
+        best, best_d2 = self._closest(numpy.concatenate(cand), owners,
+                                      flat[owners], len(flat))
+        for i in numpy.nonzero(self._beyond_d2(flat, cells, 2) <
+                               best_d2)[0]:
+            best[i] = self._search(flat[i], cells[i], best[i], best_d2[i], 2)
+        return best.reshape(xy.shape[:-1])
+
+
+def _ranges(starts, lengths):
+    """
+    Concatenate ``range(s, s + n)`` for `starts` and `lengths`.
+
+    >>> _ranges(numpy.array([5, 0]), numpy.array([2, 3]))
+    array([5, 6, 0, 1, 2])
+
+    """
+    ends = numpy.cumsum(lengths)
+    return (numpy.repeat(starts - ends + lengths, lengths) +
+            numpy.arange(ends[-1] if len(ends) else 0))
+
+
+def _is_constant(a, axis):
+    return bool((a == a.take([0], axis=axis)).all())
+
+
+def _is_monotonic(a):
+    d = numpy.diff(a)
+    return bool((d > 0).all() or (d < 0).all())
+
+
+def mesh_index(coordinates):
+    """
+    Build a spatial index for mesh `coordinates`.
+
+    Parameters
+    ----------
+    coordinates : array of shape ``(M + 1, N + 1, 2)``
+        Vertices of a quadrilateral mesh with ``M * N`` cells as in
+        ``QuadMesh._coordinates``.
+
+    Returns
+    -------
+    index : RectilinearIndex or CellGridIndex
+        `RectilinearIndex` is used if the mesh is axis-aligned.
+        Otherwise `CellGridIndex` of the cell centers is used; it
+        finds the cell whose center is closest to the query point.
+
+    """
+    coordinates = numpy.asarray(coordinates, dtype=float)
+    X = coordinates[..., 0]
+    Y = coordinates[..., 1]
+    if _is_constant(X, 0) and _is_constant(Y, 1):
+        e0, e1 = Y[:, 0], X[0]
+        if _is_monotonic(e0) and _is_monotonic(e1):
+            return RectilinearIndex(e0, e1)
+    if _is_constant(X, 1) and _is_constant(Y, 0):
+        e0, e1 = X[:, 0], Y[0]
+        if _is_monotonic(e0) and _is_monotonic(e1):
+            return RectilinearIndex(e0, e1, transposed=True)
+    centers = (coordinates[1:, 1:] + coordinates[:-1, :-1] +
+               coordinates[1:, :-1] + coordinates[:-1, 1:]) / 4
+    return CellGridIndex(centers.reshape((-1, 2)))
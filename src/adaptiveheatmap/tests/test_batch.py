@@ -0,0 +1,41 @@
+from functools import partial
+import os
+
+import numpy
+import pytest
+
+from ..batch import RenderJob, render_all
+
+
+def random_points(seed, size):
+    return tuple(numpy.random.RandomState(seed).randn(2, size))
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_render_all(tmpdir, processes):
+    rng = numpy.random.RandomState(0)
+    npy = str(tmpdir.join('data.npy'))
+    numpy.save(npy, rng.randn(30, 40))
+    X, Y = numpy.meshgrid(numpy.arange(41), numpy.arange(31))
+    jobs = [
+        RenderJob(str(tmpdir.join('a.png')), 'imshow', npy),
+        RenderJob(str(tmpdir.join('b.png')), 'pcolormesh',
+                  (X, Y, rng.randn(30, 40))),
+        RenderJob(str(tmpdir.join('c.png')), 'hist2d',
+                  partial(random_points, 0, 1000),
+                  kwargs=dict(bins=20)),
+        RenderJob(str(tmpdir.join('d.png')), 'no_such_plot', npy),
+        RenderJob(str(tmpdir.join('e.png')), 'imshow', npy,
+                  figure_kw=dict(figsize=(4, 3))),
+    ]
+    seen = []
+    results = render_all(jobs, processes=processes, callback=seen.append)
+    assert seen == results
+    assert [r.path for r in results] == [j.path for j in jobs]
+    assert [r.ok for r in results] == [True, True, True, False, True]
+    assert 'no_such_plot' in results[3].error
+    for r in results:
+        assert os.path.exists(r.path) == r.ok
+        assert r.timings['total'] >= 0
+    assert set(results[0].timings) == {'load', 'setup', 'plot', 'save',
+                                       'total'}
@@ -0,0 +1,66 @@
+from matplotlib.figure import Figure
+import numpy
+import pytest
+
+from ..binning import HexBin, Histogram2D, iterpoints
+from ..core import AdaptiveHeatmap
+
+
+def points(size=5000, seed=0):
+    rng = numpy.random.RandomState(seed)
+    x, y = rng.randn(2, size)
+    x[::50] = numpy.nan
+    return x, y, rng.uniform(size=size)
+
+
+@pytest.mark.parametrize('n_jobs', [None, 3])
+def test_histogram2d(n_jobs):
+    x, y, w = points()
+    bins = [10, numpy.array([-5, -1, 0, 0.5, 2])]
+    range = [[-2, 2], None]
+    hist = Histogram2D(bins, range)
+    hist.update_chunks(iterpoints(x, y, w, chunksize=700), n_jobs=n_jobs)
+    counts, _, _ = numpy.histogram2d(x, y, bins=[hist.xedges, bins[1]])
+    sums, _, _ = numpy.histogram2d(x, y, bins=[hist.xedges, bins[1]],
+                                   weights=w)
+    numpy.testing.assert_equal(hist.values(), counts)
+    numpy.testing.assert_allclose(hist.values('sum'), sums)
+    with numpy.errstate(invalid='ignore'):
+        numpy.testing.assert_allclose(hist.values('mean'), sums / counts)
+
+    other = Histogram2D(bins, range).update(x, y, w)
+    merged = Histogram2D(bins, range).merge(hist, other)
+    numpy.testing.assert_equal(merged.values(), 2 * counts)
+    with pytest.raises(ValueError):
+        merged.merge(Histogram2D(3, [[0, 1], [0, 1]]))
+
+
+@pytest.mark.parametrize('gridsize', [7, (5, 9)])
+def test_hexbin_matches_matplotlib(gridsize):
+    x, y, w = points()
+    extent = (-2, 2.5, -3, 2)
+    binner = HexBin(gridsize, extent)
+    binner.update_chunks(iterpoints(x, y, w, chunksize=1000))
+    ax = Figure().add_subplot(1, 1, 1)
+    expected = ax.hexbin(x, y, gridsize=gridsize, extent=extent)
+    numpy.testing.assert_equal(binner.values(), expected.get_array())
+
+    ah = AdaptiveHeatmap.make(figure=Figure(), events=False)
+    ah.plot_binned(binner)
+    numpy.testing.assert_equal(ah.mappable.get_array(), binner.values())
+    numpy.testing.assert_allclose(ah.mappable.get_offsets(),
+                                  expected.get_offsets())
+
+
+def test_plot_binned_hist2d():
+    x, y, _ = points()
+    hist = Histogram2D(20, [[-3, 3], [-3, 3]]).update(x, y)
+    ah = AdaptiveHeatmap.make(figure=Figure(), events=False)
+    ah.plot_binned(hist, cmap='magma')
+    expected = Figure().add_subplot(1, 1, 1).hist2d(
+        x[~numpy.isnan(x)], y[~numpy.isnan(x)], bins=20,
+        range=[[-3, 3], [-3, 3]])
+    numpy.testing.assert_equal(ah.mappable.get_array().ravel(),
+                               expected[3].get_array().ravel())
+    assert ah.norm.vmax == hist.values().max()
+    assert ah.cdf_lines
@@ -0,0 +1,67 @@
+from matplotlib.figure import Figure
+import numpy
+import pytest
+
+from ..cache import _replace, cached_norm
+from ..core import AdaptiveHeatmap, QuantileNormalize
+
+
+def test_save_load(tmpdir):
+    data = numpy.random.RandomState(0).randn(30, 40)
+    norm = QuantileNormalize(vmin=-1)
+    norm.autoscale(data)
+    path = str(tmpdir.join('norm.npz'))
+    norm.save(path)
+
+    loaded = QuantileNormalize.load(path, lut_size=256)
+    numpy.testing.assert_equal(loaded.quantile, norm.quantile)
+    assert (loaded.vmin, loaded.vmax) == (norm.vmin, norm.vmax)
+    assert loaded.lut_size == 256
+    numpy.testing.assert_equal(loaded.summary.xs, norm.summary.xs)
+    assert loaded.summary.count == norm.summary.count
+
+    ah = AdaptiveHeatmap.make(figure=Figure())
+    ah.plot_all('imshow', data, norm=loaded)
+
+
+def test_cached_norm(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    data = numpy.random.RandomState(0).randn(30, 40)
+    first = cached_norm(data, cache_dir, qs=10)
+    assert first.estimator == 'kll'  # bounded memory by default
+    assert len(tmpdir.join('cache').listdir()) == 1
+    second = cached_norm(data.copy(), cache_dir, qs=10)
+    numpy.testing.assert_equal(first.quantile, second.quantile)
+    assert len(tmpdir.join('cache').listdir()) == 1
+
+    cached_norm(data + 1, cache_dir, qs=10)
+    cached_norm(data, cache_dir, qs=20)
+    assert len(tmpdir.join('cache').listdir()) == 3
+
+
+def test_replace_existing(tmpdir):
+    src = tmpdir.join('src')
+    dst = tmpdir.join('dst')
+    src.write('new')
+    dst.write('old')
+    _replace(str(src), str(dst))
+    assert dst.read() == 'new'
+    assert not src.exists()
+
+
+def test_cached_norm_blocks(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    with pytest.raises(ValueError, match='key'):
+        cached_norm((b for b in [numpy.arange(10.0)]), cache_dir)
+    first = cached_norm((numpy.arange(10.0) for _ in range(1)), cache_dir,
+                        key='first')
+    second = cached_norm(iter([numpy.arange(1000.0, 1010.0)]), cache_dir,
+                         key='second')
+    assert first.vmax == 9 and second.vmin == 1000
+
+    ragged = [numpy.arange(3.0), numpy.arange(5.0)]
+    norm = cached_norm(ragged, cache_dir)
+    assert norm.vmax == 4
+    other = cached_norm([numpy.arange(3.0), numpy.arange(5.0) + 10],
+                        cache_dir)
+    assert other.vmax == 14
@@ -0,0 +1,237 @@
+from matplotlib.backend_bases import MouseEvent
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy
+import pytest
+
+from ..core import AdaptiveHeatmap, QuantileNormalize
+
+
+def make_ah(name, **kwargs):
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ah = AdaptiveHeatmap.make(figure=figure, **kwargs)
+    rng = numpy.random.RandomState(0)
+    Z = rng.randn(30, 40)
+    if name == 'imshow':
+        ah.plot_all(name, Z)
+    else:
+        X, Y = numpy.meshgrid(numpy.linspace(0, 4, 41),
+                              numpy.linspace(0, 3, 31))
+        ah.plot_all(name, X, Y, Z)
+    return ah
+
+
+@pytest.mark.parametrize('name', ['imshow', 'pcolormesh'])
+def test_batch_z_at(name):
+    ah = make_ah(name)
+    rng = numpy.random.RandomState(1)
+    xs = rng.uniform(0.5, 3.5, 50)
+    ys = rng.uniform(0.5, 2.5, 50)
+    zs = ah.z_at(xs, ys)
+    numpy.testing.assert_equal(zs, [ah.z_at(x, y) for x, y in zip(xs, ys)])
+
+    xyzq = ah.relate_xyzq(xs, ys)
+    assert len(xyzq.get_artists()) == 8
+    xyzq.remove()
+    assert len(ah.relate_xyzq(xs, ys, noline=True).get_artists()) == 4
+
+
+def test_blit_hover():
+    ah = make_ah('imshow', blit=True, hover=True)
+    canvas = ah.figure.canvas
+    canvas.draw()
+    for x, y in [(3, 4), (10, 20)]:
+        px, py = ah.ax_main.transData.transform((x, y))
+        canvas.callbacks.process(
+            'motion_notify_event',
+            MouseEvent('motion_notify_event', canvas, px, py))
+        marker = ah.event_handler.xyzq.markers[0]
+        numpy.testing.assert_allclose(marker.get_data(), [[x], [y]])
+    xyzq = ah.event_handler.xyzq
+    assert all(art.get_animated() for art in xyzq.get_artists())
+
+
+def test_shared_norm():
+    frames = numpy.random.RandomState(0).randn(3, 30, 40)
+    norm = QuantileNormalize().fit(frames)
+    quantile = norm.quantile.copy()
+    for frame in frames:
+        ah = AdaptiveHeatmap.make(figure=Figure())
+        ah.plot_all('imshow', frame, norm=norm)
+        assert ah.norm is norm
+    numpy.testing.assert_equal(norm.quantile, quantile)
+
+
+@pytest.mark.parametrize('keep_data', [True, False])
+@pytest.mark.parametrize('norm_kw', [{}, dict(window=2), dict(decay=0.5)])
+def test_update(norm_kw, keep_data):
+    rng = numpy.random.RandomState(0)
+    ah = AdaptiveHeatmap.make(figure=Figure())
+    first = rng.randn(30, 40)
+    ah.plot_all('imshow', first, norm_kw=dict(norm_kw, keep_data=keep_data))
+    for shift in [10, 20, 30]:
+        frame = rng.randn(30, 40) + shift
+        ah.update(frame)
+    assert ah.mappable.get_array()[0, 0] == frame[0, 0]
+    xs = ah.cdf_lines[0].get_xdata()
+    median = ah.norm.quantile[len(ah.norm.quantile) // 2]
+    if norm_kw:
+        # Old frames are forgotten:
+        assert median > 20
+    else:
+        assert median < 20
+        # The first frame is kept (via its summary if keep_data=False):
+        assert ah.norm.vmin == first.min()
+    assert ah.norm.vmax == xs[-1] == frame.max()
+    assert ah.cax_quantile_image.get_extent()[1] == frame.max()
+    ah.figure.canvas.draw()
+
+
+@pytest.mark.parametrize('mode', ['fixed', 'update', 'refit'])
+@pytest.mark.parametrize('name', ['imshow', 'pcolormesh'])
+def test_animate(mode, name):
+    ah = make_ah(name)
+    initial = ah.norm.quantile.copy()
+    frames = numpy.random.RandomState(1).randn(3, 30, 40)
+    frames += 100 * numpy.arange(1, 4)[:, None, None]
+    anim = ah.animate(frames, mode=mode)
+    html = anim.to_jshtml()
+    assert html
+    numpy.testing.assert_equal(ah.mappable.get_array(), frames[-1])
+    if mode == 'fixed':
+        numpy.testing.assert_equal(ah.norm.quantile, initial)
+    elif mode == 'refit':
+        # Only the last frame, not the previous ones:
+        numpy.testing.assert_equal(
+            ah.norm.quantile, QuantileNormalize().fit(frames[-1]).quantile)
+    else:
+        assert ah.norm.vmin == initial[0]
+        assert ah.norm.vmax == frames.max()
+
+
+def rendered(figure):
+    figure.canvas.draw()
+    return numpy.asarray(figure.canvas.buffer_rgba()).copy()
+
+
+@pytest.mark.parametrize('first', ['imshow', 'pcolormesh'])
+@pytest.mark.parametrize('second', ['imshow', 'pcolormesh'])
+def test_reset(first, second):
+    ah = make_ah(first, events=False)
+    assert ah.event_handler is None
+    ah.set_xlabel('x')
+    rendered(ah.figure)
+    ah.reset()
+    axes = ah.ax_main
+    rng = numpy.random.RandomState(0)
+    Z = rng.randn(30, 40)
+    if second == 'imshow':
+        ah.plot_all(second, Z)
+    else:
+        X, Y = numpy.meshgrid(numpy.linspace(0, 4, 41),
+                              numpy.linspace(0, 3, 31))
+        ah.plot_all(second, X, Y, Z)
+    assert ah.ax_main is axes
+    fresh = make_ah(second)
+    numpy.testing.assert_equal(rendered(ah.figure), rendered(fresh.figure))
+
+
+@pytest.mark.parametrize('name', ['pcolormesh', 'pcolor'])
+def test_weights_area(name):
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ah = AdaptiveHeatmap.make(figure=figure)
+    # One wide column of ones and many narrow columns of zeros:
+    x = numpy.concatenate([[0], numpy.linspace(9, 10, 11)])
+    X, Y = numpy.meshgrid(x, [0, 1, 2])
+    Z = numpy.zeros((2, 11))
+    Z[:, 0] = 1
+    ah.plot_all(name, X, Y, Z, norm_weights='area')
+    assert ah.norm.summary.count == pytest.approx(20)
+    summary = ah.norm.summary
+    assert summary.ps[summary.xs == 0].max() == pytest.approx(0.1)
+    # Without weights, the ones would be above the 90th percentile:
+    assert float(ah.norm(0.5)) < 0.5
+    xs, ps = ah.ax_cdf.lines[0].get_data()
+    assert xs.max() == 1 and ps.min() >= 0
+    rendered(figure)
+
+
+def test_weights_counts():
+    from ..binning import Histogram2D
+    rng = numpy.random.RandomState(0)
+    hist = Histogram2D(bins=8, range=[[-3, 3], [-3, 3]])
+    hist.update(rng.randn(1000), rng.randn(1000), rng.rand(1000))
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ah = AdaptiveHeatmap.make(figure=figure)
+    ah.plot_binned(hist, 'mean', norm_weights='counts')
+    assert ah.norm.summary.count == hist.counts.sum()
+
+
+def test_weights_norm(monkeypatch):
+    rng = numpy.random.RandomState(0)
+    Z = rng.randn(3, 4)
+    shared = QuantileNormalize().fit(Z * 10)
+    quantile = shared.quantile.copy()
+    ah = AdaptiveHeatmap.make(figure=Figure())
+    with pytest.raises(ValueError):
+        ah.plot_all('pcolormesh', Z, norm=shared, norm_weights='area')
+    numpy.testing.assert_equal(shared.quantile, quantile)
+    assert shared.weights is None
+    weighted = QuantileNormalize(weights=numpy.ones(12))
+    weighted.autoscale(Z)
+    with pytest.raises(ValueError, match='weights'):
+        weighted.update(Z)
+
+    calls = []
+    autoscale = QuantileNormalize.autoscale
+    monkeypatch.setattr(QuantileNormalize, 'autoscale',
+                        lambda self, data: calls.append(autoscale(self, data)))
+    ah.reset()
+    ah.plot_all('pcolormesh', Z, norm_weights=numpy.arange(12.0))
+    assert len(calls) == 1
+    assert ah.norm.summary.count == 66
+
+
+def test_colorbar_cache(monkeypatch):
+    ah = make_ah('pcolormesh')
+    Z = ah.zdata
+    assert ah.cax_quantile_image.get_extent()[:2] == [Z.min(), Z.max()]
+    gradient = ah.cax_quantile_image.get_array()
+
+    def scan(*_):
+        raise AssertionError('data is scanned')
+
+    monkeypatch.setattr(numpy, 'nanmin', scan)
+    monkeypatch.setattr(numpy, 'nanmax', scan)
+    cached = ah._gradient[1]
+    ah.plot_sub()
+    assert ah._gradient[1] is cached
+    numpy.testing.assert_equal(ah.cax_quantile_image.get_array(), gradient)
+
+    ah.update(Z + 1)
+    assert ah._gradient[1] is not cached
+    extent = ah.cax_quantile_image.get_extent()
+    # Both frames are folded into the norm:
+    assert extent[:2] == pytest.approx([Z.min(), Z.max() + 1])
+
+
+def test_estimator_cdf():
+    data = numpy.random.RandomState(0).randn(300, 400)
+    ah = AdaptiveHeatmap.make(figure=Figure())
+    ah.plot_all('imshow', data, norm_kw=dict(estimator='kll'))
+    xs, _ = ah.cdf_lines[0].get_data()
+    assert len(xs) <= 2 * ah.norm.summary_size
+    assert ah.norm._filtered_data is None  # no full copy for the CDF
+
+
+def test_hist2d_weights():
+    rng = numpy.random.RandomState(0)
+    x, y, w = rng.randn(3, 1000)
+    ah = AdaptiveHeatmap.make(figure=Figure())
+    counts = ah.hist2d(x, y, weights=w)[0]
+    expected = numpy.histogram2d(x, y, bins=10, weights=w)[0]
+    numpy.testing.assert_allclose(counts, expected)
+    assert ah.norm.weights is None
@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+
+def test_no_pyplot_on_import():
+    code = """
+import sys
+import adaptiveheatmap
+import adaptiveheatmap.utils
+assert 'matplotlib.pyplot' not in sys.modules
+"""
+    subprocess.check_call([sys.executable, '-c', code])
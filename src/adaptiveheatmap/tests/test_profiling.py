@@ -0,0 +1,43 @@
+import numpy
+
+from ..core import QuantileNormalize
+from ..profiling import Profiler
+from .test_core import make_ah
+
+
+def test_plot_all_stages():
+    seen = []
+    with Profiler(callback=seen.append, trace_memory=True) as prof:
+        ah = make_ah('imshow')
+    assert seen == prof.records
+    names = [r['name'] for r in prof.records]
+    for name in ['plot_all', 'plot_main', 'plot_sub', 'plot_cdf',
+                 'colorbar_quantile', 'colorbar_original']:
+        assert 'AdaptiveHeatmap.' + name in names
+    for name in ['autoscale', 'filter', 'quantile', '__call__']:
+        assert 'QuantileNormalize.' + name in names
+
+    (outer,) = [r for r in prof.records if r['depth'] == 0]
+    assert outer['name'] == 'AdaptiveHeatmap.plot_all'
+    assert outer['size'] == 30 * 40
+    assert outer['nbytes'] == 30 * 40 * 8
+    assert all(r['wall_time'] <= outer['wall_time'] for r in prof.records)
+    filtered = prof.summary()['QuantileNormalize.filter']
+    assert filtered['count'] == 1
+    assert filtered['peak'] >= 30 * 40 * 8  # filtered copy
+    assert outer['peak'] >= filtered['peak']
+    assert 'AdaptiveHeatmap.plot_cdf' in prof.report()
+
+    # Nothing is recorded outside of the context:
+    ah.norm(numpy.zeros(3))
+    assert len(prof.records) == len(seen)
+
+
+def test_trace_memory_without_reset_peak(monkeypatch):
+    import tracemalloc
+    monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+    with Profiler(trace_memory=True) as prof:
+        QuantileNormalize().autoscale(numpy.arange(1000.0))
+    assert all(r['peak'] is None for r in prof.records)
+    assert all(r['allocated'] is not None for r in prof.records)
+    assert 'peak' not in prof.summary()['QuantileNormalize.autoscale']
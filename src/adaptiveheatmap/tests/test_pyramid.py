@@ -0,0 +1,82 @@
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy
+import pytest
+
+from ..core import AdaptiveHeatmap
+from ..pyramid import RasterPyramid, downsample
+
+
+def raster(shape=(600, 1000)):
+    rng = numpy.random.RandomState(0)
+    data = rng.randn(*shape)
+    data[rng.uniform(size=shape) < 0.05] = numpy.nan
+    return data
+
+
+@pytest.mark.parametrize('reduce, func', [('mean', numpy.nanmean),
+                                          ('min', numpy.nanmin),
+                                          ('max', numpy.nanmax)])
+@pytest.mark.filterwarnings('ignore:All-NaN slice:RuntimeWarning')
+@pytest.mark.filterwarnings('ignore:Mean of empty slice:RuntimeWarning')
+def test_downsample(reduce, func):
+    data = raster((7, 9))
+    data[:2, :2] = numpy.nan
+    actual = downsample(data, 2, reduce)
+    assert actual.shape == (4, 5)
+    assert numpy.isnan(actual[0, 0])
+    expected = [[func(data[i:i + 2, j:j + 2]) for j in range(0, 9, 2)]
+                for i in range(0, 7, 2)]
+    numpy.testing.assert_allclose(actual, expected)
+
+
+def test_pyramid_levels():
+    data = raster()
+    pyramid = RasterPyramid(data, min_size=100, slab_size=5000)
+    assert [l.shape for l in pyramid.levels] == [
+        (600, 1000), (300, 500), (150, 250), (75, 125), (38, 63)]
+    numpy.testing.assert_allclose(pyramid.levels[1], downsample(data))
+    assert pyramid.choose_level(600, 1000, 300, 400) == 1
+    assert pyramid.choose_level(60, 100, 300, 400) == 0
+
+
+@pytest.mark.parametrize('origin', ['upper', 'lower'])
+def test_imshow_pyramid(origin):
+    data = raster()
+    figure = Figure(figsize=(4, 3), dpi=50)
+    FigureCanvasAgg(figure)
+    ah = AdaptiveHeatmap.make(figure=figure, events=False)
+    ah.imshow_pyramid(data, origin=origin, norm_kw=dict(estimator='exact'))
+    numpy.testing.assert_allclose(
+        ah.norm.quantile,
+        numpy.nanpercentile(data, numpy.linspace(0, 100, 101)))
+    coarse = ah.mappable.get_array()
+    assert coarse.size < data.size / 4
+    figure.canvas.draw()
+
+    # Zoom in so that full resolution tiles are shown:
+    ah.ax_main.set_xlim(100, 120)
+    if origin == 'upper':
+        ah.ax_main.set_ylim(60, 50)
+    else:
+        ah.ax_main.set_ylim(50, 60)
+    assert ah.pyramid_image.view()[0] == 0
+    tile = ah.mappable.get_array()
+    assert tile.shape[0] < 20 and tile.shape[1] < 30
+    assert ah.z_at(110, 55) == data[55, 110]
+    figure.canvas.draw()
+    # Integer extent and indices (true division on Python 2 too):
+    assert ah.pyramid_image._to_coordinate(1, 0, 10, 4) == 2.5
+
+
+def test_reset_after_imshow_pyramid():
+    figure = Figure(figsize=(4, 3), dpi=50)
+    FigureCanvasAgg(figure)
+    ah = AdaptiveHeatmap.make(figure=figure, events=False)
+    ah.imshow_pyramid(raster())
+    ah.reset()
+    assert ah.pyramid_image is None
+    ah.plot_all('imshow', numpy.arange(12.0).reshape((3, 4)))
+    ah.ax_main.set_xlim(0, 2)
+    ah.ax_main.set_ylim(0, 2)
+    figure.canvas.draw()
@@ -0,0 +1,295 @@
+import pickle
+
+import numpy
+import pytest
+
+from ..core import QuantileNormalize
+from ..quantiles import ExactQuantile, KLLSketch
+from ..utils import finitevalues
+
+
+def rank_error(data, qs, quantile):
+    data = numpy.sort(data)
+    ranks = numpy.searchsorted(data, quantile) / (len(data) - 1.0)
+    return abs(ranks - qs).max()
+
+
+def test_kll_small_is_exact():
+    data = numpy.random.RandomState(0).randn(100)
+    sketch = KLLSketch()
+    sketch.update(data)
+    qs = numpy.linspace(0, 1, 101)
+    numpy.testing.assert_allclose(sketch.quantile(qs),
+                                  numpy.percentile(data, qs * 100))
+
+
+@pytest.mark.parametrize('n', [1000, 100000])
+def test_kll_rank_error(n):
+    data = numpy.random.RandomState(0).randn(n)
+    sketch = KLLSketch()
+    sketch.update(data)
+    qs = numpy.linspace(0, 1, 101)
+    assert rank_error(data, qs, sketch.quantile(qs)) < 0.02
+    assert sketch.quantile(0) == data.min()
+    assert sketch.quantile(1) == data.max()
+
+
+@pytest.mark.parametrize('cls', [ExactQuantile, KLLSketch])
+def test_merge(cls):
+    data = numpy.random.RandomState(0).randn(20000)
+    merged = cls()
+    for chunk in numpy.array_split(data, 7):
+        part = cls()
+        part.update(chunk)
+        merged.merge(part)
+    assert merged.count == data.size
+    qs = numpy.linspace(0, 1, 11)
+    assert rank_error(data, qs, merged.quantile(qs)) < 0.02
+
+
+def test_norm_estimator():
+    data = numpy.random.RandomState(0).randn(300, 400)
+    data[::5] = numpy.nan
+    exact = QuantileNormalize()
+    exact.autoscale(data)
+    sketch = QuantileNormalize(estimator='kll', block_size=1000)
+    sketch.autoscale(data)
+    assert sketch.vmin == exact.vmin
+    assert sketch.vmax == exact.vmax
+    qs = numpy.linspace(0, 1, len(exact.quantile))
+    assert rank_error(finitevalues(data), qs, sketch.quantile) < 0.02
+    numpy.testing.assert_equal(sketch.filtered_data, exact.filtered_data)
+
+
+def test_autoscale_chunked(tmpdir):
+    data = numpy.random.RandomState(0).randn(200, 300)
+    data[::3] = numpy.nan
+    memmap = numpy.memmap(str(tmpdir.join('data.bin')), dtype=float,
+                          mode='w+', shape=data.shape)
+    memmap[:] = data
+
+    exact = QuantileNormalize()
+    exact.autoscale(data)
+    qs = numpy.linspace(0, 1, len(exact.quantile))
+    for source in [memmap, iter(data)]:
+        norm = QuantileNormalize().autoscale_chunked(source, chunksize=1000)
+        assert norm.vmin == exact.vmin
+        assert norm.vmax == exact.vmax
+        assert rank_error(finitevalues(data), qs, norm.quantile) < 0.02
+
+
+@pytest.mark.parametrize('estimator', [None, 'kll'])
+def test_keep_data_false(estimator):
+    data = numpy.random.RandomState(0).randn(100, 100)
+    norm = QuantileNormalize(keep_data=False, estimator=estimator)
+    norm.autoscale(data)
+    assert norm._raw_data is None
+    assert norm._filtered_data is None
+    summary = norm.summary
+    assert summary.count == data.size
+    assert summary.min == data.min()
+    assert summary.max == data.max()
+    assert len(summary.xs) == norm.summary_size
+
+
+@pytest.mark.parametrize('interpolate', [False, True])
+@pytest.mark.parametrize('lut_size', [None, 4096])
+def test_fast_call(interpolate, lut_size):
+    data = numpy.ma.masked_invalid(numpy.random.RandomState(0).randn(50, 60))
+    data[::7] = numpy.ma.masked
+    exact = QuantileNormalize()
+    exact.autoscale(data)
+    norm = QuantileNormalize(quantile=exact.quantile, interpolate=interpolate,
+                             lut_size=lut_size)
+    result = norm(data)
+    numpy.testing.assert_equal(result.mask, data.mask)
+    # Off by at most (about) one of the 100 levels:
+    assert abs(result - exact(data)).max() < 0.011
+    assert norm(norm.vmin) == pytest.approx(0, abs=1e-3)
+    assert norm(norm.vmax) == pytest.approx(1, abs=1e-3)
+    assert norm(norm.vmax + 1) > 1
+    assert norm(norm.vmax + 1, clip=True) == 1
+
+
+@pytest.mark.parametrize('interpolate', [False, True])
+@pytest.mark.parametrize('lut_size', [16, 4096])
+def test_lut_heavy_tailed(interpolate, lut_size):
+    data = numpy.random.RandomState(0).standard_cauchy(20000)
+    exact = QuantileNormalize(interpolate=interpolate)
+    exact.autoscale(data)
+    norm = QuantileNormalize(quantile=exact.quantile, interpolate=interpolate,
+                             lut_size=lut_size)
+    values = numpy.concatenate([data, exact.quantile, [-1.0, 0.0, 1.0],
+                                [exact.vmin - 1, exact.vmax + 1]])
+    for clip in [False, True]:
+        numpy.testing.assert_allclose(norm(values, clip=clip),
+                                      exact(values, clip=clip),
+                                      rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('norm_kw', [{}, dict(interpolate=True),
+                                     dict(lut_size=1024)])
+def test_call_out(norm_kw):
+    data = numpy.ma.masked_invalid(numpy.random.RandomState(0).randn(50, 60))
+    norm = QuantileNormalize(**norm_kw)
+    expected = norm(data)
+
+    out = numpy.empty(data.shape)
+    result = norm(data, out=out)
+    assert numpy.shares_memory(result, out)
+    numpy.testing.assert_equal(result, expected)
+
+    norm.reuse_buffers = True
+    first = norm(data)
+    second = norm(data)
+    assert numpy.shares_memory(first, second)
+    numpy.testing.assert_equal(second, expected)
+
+
+@pytest.mark.parametrize('norm_kw', [{}, dict(interpolate=True),
+                                     dict(lut_size=1024)])
+@pytest.mark.parametrize('clip', [False, True])
+@pytest.mark.parametrize('dtype', [float, int])
+def test_call_out_memory(norm_kw, clip, dtype):
+    tracemalloc = pytest.importorskip('tracemalloc')
+    rng = numpy.random.RandomState(0)
+    data = numpy.ma.masked_array((rng.randn(1000, 1000) * 100).astype(dtype),
+                                 mask=rng.uniform(size=(1000, 1000)) < 0.1)
+    norm = QuantileNormalize(reuse_buffers=True, **norm_kw)
+    norm(data, clip=clip)
+    tracemalloc.start()
+    try:
+        result = norm(data, clip=clip)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Only block-sized temporaries (the data takes 8 MB):
+    assert peak < 4e6
+    expected = QuantileNormalize(quantile=norm.quantile, **norm_kw)(
+        data, clip=clip)
+    numpy.testing.assert_equal(result, expected)
+
+
+@pytest.mark.parametrize('estimator', [None, 'kll'])
+def test_fit_merge(estimator):
+    frames = numpy.random.RandomState(0).randn(6, 40, 50)
+    frames[:, ::4] = numpy.nan
+    full = QuantileNormalize(estimator=estimator).fit(frames)
+
+    partials = [pickle.loads(pickle.dumps(
+        QuantileNormalize(estimator=estimator).fit(frame)))
+        for frame in frames]
+    merged = partials[0].merge(*partials[1:])
+    assert merged.vmin == full.vmin == numpy.nanmin(frames)
+    assert merged.vmax == full.vmax == numpy.nanmax(frames)
+    assert merged.summary.count == full.summary.count
+    qs = numpy.linspace(0, 1, len(full.quantile))
+    assert rank_error(finitevalues(frames), qs, merged.quantile) < 0.02
+
+    incremental = QuantileNormalize(estimator=estimator)
+    for frame in frames:
+        incremental.partial_fit(frame)
+    assert rank_error(finitevalues(frames), qs, incremental.quantile) < 0.02
+    if estimator is None:
+        numpy.testing.assert_allclose(incremental.quantile, full.quantile)
+
+
+def test_merge_mismatch():
+    data = numpy.random.RandomState(0).randn(2, 100)
+    exact = QuantileNormalize().fit(data[0])
+    kll = QuantileNormalize(estimator='kll').fit(data[1])
+    quantile = exact.quantile.copy()
+    with pytest.raises(ValueError) as excinfo:
+        exact.merge(kll)
+    assert 'ExactQuantile' in str(excinfo.value)
+    assert 'KLLSketch' in str(excinfo.value)
+    numpy.testing.assert_equal(exact.quantile, quantile)
+    with pytest.raises(ValueError, match='ExactQuantile'):
+        kll.merge(exact.estimator_state)
+
+
+@pytest.mark.parametrize('estimator', [None, 'exact', 'kll'])
+def test_parallel(estimator):
+    data = numpy.random.RandomState(0).randn(200, 300)
+    data[::3] = numpy.nan
+    serial = QuantileNormalize(estimator=estimator)
+    serial.autoscale(data)
+    parallel = QuantileNormalize(estimator=estimator, n_jobs=3,
+                                 block_size=1000)
+    parallel.autoscale(data)
+    assert parallel.vmin == serial.vmin
+    assert parallel.vmax == serial.vmax
+    if estimator == 'exact':
+        numpy.testing.assert_allclose(parallel.quantile, serial.quantile)
+    qs = numpy.linspace(0, 1, len(serial.quantile))
+    assert rank_error(finitevalues(data), qs, parallel.quantile) < 0.02
+
+    chunked = QuantileNormalize(estimator=estimator, n_jobs=3)
+    chunked.autoscale_chunked(iter(data), chunksize=1000)
+    assert rank_error(finitevalues(data), qs, chunked.quantile) < 0.02
+
+
+def test_weighted():
+    rng = numpy.random.RandomState(0)
+    data = rng.randn(50, 60)
+    data[::7] = numpy.nan
+    weights = rng.randint(0, 5, size=data.shape)
+    norm = QuantileNormalize(weights=weights)
+    norm.autoscale(data)
+    keep = numpy.isfinite(data) & (weights > 0)
+    replicated = numpy.repeat(data[keep], weights[keep])
+    assert norm.vmin == replicated.min()
+    assert norm.vmax == replicated.max()
+    qs = numpy.linspace(0, 1, len(norm.quantile))
+    assert rank_error(replicated, qs, norm.quantile) < 0.01
+    assert norm.summary.count == weights[keep].sum()
+    summary = norm.summary
+    assert rank_error(replicated, summary.ps[1:-1], summary.xs[1:-1]) < 0.01
+
+    with pytest.raises(ValueError):
+        QuantileNormalize(weights=weights, estimator='kll').autoscale(data)
+
+
+@pytest.mark.parametrize('norm_kw', [{}, dict(keep_data=False),
+                                     dict(window=3)])
+def test_refit_disjoint(norm_kw):
+    A, B, C, D = (numpy.arange(100.0) + 1000 * i for i in range(4))
+    norm = QuantileNormalize(**norm_kw)
+    norm.fit(A)
+    norm.update(B)
+    norm.fit(C)
+    numpy.testing.assert_equal(norm.quantile,
+                               QuantileNormalize(**norm_kw).fit(C).quantile)
+    norm.update(D)
+    assert norm.vmin == C.min()
+
+    # autoscale filters the data by the current vmin and vmax:
+    norm.vmin = norm.vmax = None
+    norm.autoscale(A)
+    norm.update(B)
+    norm.vmin = norm.vmax = None
+    norm.autoscale(D)
+    assert norm.vmin == D.min()
+    norm.update(C)
+    assert norm.vmin == C.min() and norm.vmax == D.max()
+
+    norm.vmin = norm.vmax = None
+    norm.autoscale_chunked(C)
+    norm.update(D)
+    assert norm.vmin == C.min()
+
+
+def test_update_bounded():
+    rng = numpy.random.RandomState(0)
+    frames = [rng.randn(100, 100) + i for i in range(10)]
+    norm = QuantileNormalize()
+    norm.autoscale(frames[0])
+    for frame in frames[1:]:
+        norm.update(frame)
+    sketch = norm._batches[-1]
+    assert isinstance(sketch, KLLSketch)
+    assert len(sketch.weighted_items()[0]) < 1000
+    assert norm.vmin == min(f.min() for f in frames)
+    assert norm.vmax == max(f.max() for f in frames)
+    qs = numpy.linspace(0, 1, len(norm.quantile))
+    assert rank_error(numpy.ravel(frames), qs, norm.quantile) < 0.02
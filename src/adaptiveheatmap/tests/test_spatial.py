@@ -0,0 +1,64 @@
+import numpy
+import pytest
+
+from ..spatial import CellGridIndex, RectilinearIndex, mesh_index
+
+
+def corners(X, Y):
+    return numpy.stack([X, Y], axis=-1)
+
+
+@pytest.mark.parametrize('transposed', [False, True])
+@pytest.mark.parametrize('xstep', [1, -1])
+def test_rectilinear(transposed, xstep):
+    xedges = numpy.array([0, 1, 3, 6, 10.0])[::xstep]
+    yedges = numpy.array([0, 2, 3.0])
+    if transposed:
+        Y, X = numpy.meshgrid(yedges, xedges)
+    else:
+        X, Y = numpy.meshgrid(xedges, yedges)
+    index = mesh_index(corners(X, Y))
+    assert isinstance(index, RectilinearIndex)
+
+    x = numpy.array([0.5, 2, 9, 2, -5])
+    y = numpy.array([1, 1, 2.5, 2.5, 100])
+    i0 = [0, 0, 1, 1, 1]  # along y
+    i1 = [0, 1, 3, 1, 0]  # along x
+    if xstep < 0:
+        i1 = [3 - i for i in i1]
+    if transposed:
+        expected = numpy.ravel_multi_index((i1, i0), X[1:, 1:].shape)
+    else:
+        expected = numpy.ravel_multi_index((i0, i1), X[1:, 1:].shape)
+    numpy.testing.assert_equal(index.query(x, y), expected)
+
+
+def test_cell_grid_matches_brute_force():
+    rng = numpy.random.RandomState(0)
+    points = rng.randn(2000, 2) * [1, 10]
+    index = CellGridIndex(points)
+    queries = rng.randn(300, 2) * [2, 20]
+    found = index.query(queries[:, 0], queries[:, 1])
+    d2 = ((points[None] - queries[:, None]) ** 2).sum(axis=-1)
+    numpy.testing.assert_equal(d2[numpy.arange(300), found], d2.min(axis=1))
+
+
+def test_cell_grid_off_mesh():
+    # Queries in the hole and outside of a half annulus need searching
+    # beyond the neighboring buckets:
+    R, T = numpy.mgrid[1:2:41j, 0:numpy.pi:81j]
+    points = numpy.stack([R * numpy.cos(T), R * numpy.sin(T)], axis=-1)
+    points = points.reshape((-1, 2))
+    index = CellGridIndex(points)
+    rng = numpy.random.RandomState(0)
+    queries = rng.uniform([-3, -1], [3, 3], size=(300, 2))
+    found = index.query(queries[:, 0], queries[:, 1])
+    d2 = ((points[None] - queries[:, None]) ** 2).sum(axis=-1)
+    numpy.testing.assert_equal(found, d2.argmin(axis=1))
+
+
+def test_curvilinear_uses_cell_grid():
+    R, T = numpy.mgrid[1:2:11j, 0:3:21j]
+    index = mesh_index(corners(R * numpy.cos(T), R * numpy.sin(T)))
+    assert isinstance(index, CellGridIndex)
+    assert index.query(0.0, 1.5).shape == ()
@@ -0,0 +1,50 @@
+import numpy
+import pytest
+
+from ..utils import cdf, decimate_steps, filtered_values, finitevalues
+
+
+@pytest.mark.parametrize('normed', [True, False])
+def test_cdf_lengths(normed):
+    data = numpy.random.RandomState(0).randn(1000)
+    xs, ys = cdf(data, normed=normed)
+    assert len(xs) == len(ys) == 1000
+    assert ys[-1] == (1 if normed else 1000)
+
+    xs, ys = cdf(data, normed=normed, npoints=50)
+    assert len(xs) == len(ys) == 50
+    assert xs[0] == data.min()
+    assert xs[-1] == data.max()
+
+
+def test_decimate_steps_within_cell():
+    data = numpy.random.RandomState(0).standard_cauchy(100000)
+    xs, ys = cdf(data)
+    dx = (xs[-1] - xs[0]) / 500
+    dy = 1.0 / 500
+    dxs, dys = decimate_steps(xs, ys, dx, dy)
+    assert len(dxs) < 4 * (500 + 500)
+    # Evaluate both step functions on the original vertices:
+    idx = numpy.searchsorted(dxs, xs, side='left')
+    assert (abs(dys[idx] - ys) <= dy + 1e-12).all()
+
+
+@pytest.mark.parametrize('vmin, vmax', [(None, None), (-1, None),
+                                        (None, 0.5), (-1, 0.5), (1, -1)])
+@pytest.mark.parametrize('use_out', [False, True])
+def test_filtered_values(vmin, vmax, use_out):
+    rng = numpy.random.RandomState(0)
+    data = rng.randn(100, 70)
+    data[rng.uniform(size=data.shape) < 0.1] = numpy.nan
+    data[rng.uniform(size=data.shape) < 0.01] = numpy.inf
+    data = numpy.ma.MaskedArray(data, rng.uniform(size=data.shape) < 0.2)
+    expected = finitevalues(data)
+    if vmin is not None:
+        expected = expected[expected >= vmin]
+    if vmax is not None:
+        expected = expected[expected <= vmax]
+    out = numpy.empty(data.size + 3) if use_out else None
+    actual = filtered_values(data, vmin, vmax, out=out, block_size=1000)
+    numpy.testing.assert_equal(actual, expected)
+    if use_out:
+        assert actual.base is out
@@ -0,0 +1,150 @@
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy
+import pytest
+
+from ..core import AdaptiveHeatmap
+from ..quantiles import WeightedSample
+from ..zoom import TileSummaries
+
+
+def field(shape=(300, 400)):
+    rng = numpy.random.RandomState(0)
+    Y, X = numpy.mgrid[:shape[0], :shape[1]]
+    Z = X / 10.0 + rng.randn(*shape)
+    Z[rng.uniform(size=shape) < 0.05] = numpy.nan
+    return Z
+
+
+def view_quantile(Z, rows, cols, qs):
+    return numpy.nanpercentile(Z[rows, cols], qs * 100)
+
+
+def test_tile_summaries():
+    Z = field()
+    summaries = TileSummaries(Z, tile_size=32, knots=32, slab_size=5000)
+    assert summaries.counts.shape == (10, 13)
+    assert summaries.counts.sum() == numpy.isfinite(Z).sum()
+    sample = summaries.sample(slice(0, 300), slice(0, 400))
+    assert sample.min == numpy.nanmin(Z)
+    assert sample.max == numpy.nanmax(Z)
+    qs = numpy.linspace(0, 1, 11)
+    numpy.testing.assert_allclose(
+        sample.quantile(qs), view_quantile(Z, slice(None), slice(None), qs),
+        atol=0.3)
+
+
+def test_tile_summaries_levels():
+    Z = field()
+    summaries = TileSummaries(Z, tile_size=16, knots=16, max_tiles=12)
+    assert [level[1].shape for level in summaries.levels] == [
+        (19, 25), (10, 13), (5, 7), (3, 4), (2, 2), (1, 1)]
+    for knots, counts, mins, maxs in summaries.levels:
+        assert counts.sum() == numpy.isfinite(Z).sum()
+        assert numpy.nanmin(mins) == numpy.nanmin(Z)
+        assert numpy.nanmax(maxs) == numpy.nanmax(Z)
+
+    calls = []
+    from_items = WeightedSample.from_items
+
+    def spy(items, *args):
+        calls.append(numpy.size(items))
+        return from_items(items, *args)
+
+    WeightedSample.from_items = staticmethod(spy)
+    try:
+        sample = summaries.sample(slice(0, 300), slice(0, 400))
+    finally:
+        WeightedSample.from_items = from_items
+    # The 3x4 tiles of the level with tile size 128:
+    assert calls == [12 * 16]
+    assert sample.min == numpy.nanmin(Z)
+    qs = numpy.linspace(0, 1, 11)
+    numpy.testing.assert_allclose(
+        sample.quantile(qs)[1:-1],
+        view_quantile(Z, slice(None), slice(None), qs)[1:-1],
+        atol=0.6)
+
+
+def plot_follow_view(name, Z):
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ah = AdaptiveHeatmap.make(figure=figure, events=False)
+    if name == 'imshow':
+        ah.plot_all(name, Z)
+    else:
+        ah.plot_all(name, numpy.arange(401.0), numpy.arange(301.0), Z)
+    return ah
+
+
+def test_follow_view_refits_once():
+    ah = plot_follow_view('imshow', field())
+    view_norm = ah.follow_view(tile_size=32, exact_limit=1000)
+    views = []
+    refit = view_norm.refit
+
+    def spy(*args):
+        views.append(view_norm.view())
+        return refit(*args)
+
+    view_norm.refit = spy
+    ah.ax_main.set_xlim(100, 120)
+    ah.ax_main.set_ylim(280, 250)
+    assert views == []
+    ah.figure.canvas.draw()
+    # Refitted once to the complete view; the redraw does not refit:
+    assert view_norm._current == (250, 281, 100, 121)
+    assert views[0] == (slice(250, 281), slice(100, 121))
+    assert len(views) == 2
+    ah.figure.canvas.draw()
+    assert len(views) == 3
+
+
+@pytest.mark.parametrize('name', ['imshow', 'pcolormesh'])
+def test_follow_view(name):
+    Z = field()
+    ah = plot_follow_view(name, Z)
+    draw = ah.figure.canvas.draw
+    initial = ah.norm.quantile.copy()
+    view_norm = ah.follow_view(tile_size=32, exact_limit=1000)
+    qs = numpy.linspace(0, 1, len(initial))
+
+    # Large view: estimated from the tile summaries (aligned to tiles).
+    ah.ax_main.set_xlim(63.5 if name == 'imshow' else 64, 191.5)
+    draw()
+    rows, cols = view_norm.view()
+    assert cols == slice(64, 192)
+    assert rows == slice(0, 300)
+    numpy.testing.assert_allclose(
+        ah.norm.quantile[1:-1], view_quantile(Z, rows, cols, qs)[1:-1],
+        atol=0.3)
+    assert ah.norm.vmax < initial[-1]
+    assert ah.cdf_lines[0].get_xdata()[-1] == ah.norm.vmax
+
+    # Small view: exact.
+    ah.ax_main.set_xlim(100, 120)
+    ah.ax_main.set_ylim((280, 250) if name == 'imshow' else (250, 280))
+    draw()
+    rows, cols = view_norm.view()
+    assert (rows.stop - rows.start) * (cols.stop - cols.start) <= 1000
+    numpy.testing.assert_allclose(
+        ah.norm.quantile, view_quantile(Z, rows, cols, qs))
+
+    # Whole data: the initial fit is restored.
+    ah.ax_main.set_xlim(-10, 500)
+    ah.ax_main.set_ylim(-10, 500)
+    draw()
+    numpy.testing.assert_equal(ah.norm.quantile, initial)
+
+
+def test_reset_after_follow_view():
+    Z = field()
+    ah = AdaptiveHeatmap.make(figure=Figure(), events=False)
+    ah.plot_all('imshow', Z)
+    ah.follow_view(tile_size=32)
+    ah.reset()
+    assert ah.view_norm is None
+    ah.plot_all('imshow', Z[:100, :100] * 10)
+    initial = ah.norm.quantile.copy()
+    ah.ax_main.set_xlim(10, 20)
+    numpy.testing.assert_equal(ah.norm.quantile, initial)
@@ -1,7 +1,11 @@
+from collections import deque
 from contextlib import contextmanager
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 import numpy
-from matplotlib import pyplot
+
+from .quantiles import CDFSummary
 
 
 def finitevalues(data):
@@ -39,32 +43,289 @@ def finitevalues(data):
     return data[numpy.isfinite(data)]
 
 
-def cdf(data, normed=True):
+def filtered_values(data, vmin=None, vmax=None, out=None,
+                    block_size=2 ** 16):
     """
-    Calculate cumulative distribution function from `data`.
+    Finite, unmasked values of `data` within ``[vmin, vmax]``.
+
+    It is equivalent to filtering the result of `finitevalues` by
+    `vmin` and `vmax` but `data` is processed block by block so that
+    the masks and the selected values of each block stay in the CPU
+    cache and `data` is read from memory only once.
+
+    Parameters
+    ----------
+    data : array-like
+    vmin, vmax : float or None
+        Inclusive bounds.  None means unbounded.
+    out : numpy.ndarray or None
+        Caller-owned one dimensional buffer with at least as many
+        elements as `data`.  The values are written to its head and a
+        view of it is returned.  If None, a new array is returned.
+    block_size : int
+        Number of elements processed at once.
+
+    Returns
+    -------
+    array : numpy.ndarray
+        One dimensional array of the selected values.
+
+    Examples
+    --------
+    >>> filtered_values([1, numpy.nan, 2, numpy.inf, 3], vmin=2)
+    array([2., 3.])
+    >>> out = numpy.zeros(5)
+    >>> filtered_values([1, 2, 3], vmax=2, out=out)
+    array([1., 2.])
+    >>> out
+    array([1., 2., 0., 0., 0.])
+
+    """
+    data = numpy.asanyarray(data)
+    mask = None
+    if numpy.ma.is_masked(data):
+        mask = numpy.ma.getmaskarray(data).reshape(-1)
+    values = numpy.ma.getdata(data).reshape(-1)
+    if out is None and mask is None and vmin is None and vmax is None:
+        # Only one mask; fancy indexing is as fast as blocking:
+        return values[numpy.isfinite(values)]
+    if out is None:
+        result = numpy.empty(values.size, values.dtype)
+    else:
+        if out.ndim != 1 or out.size < values.size:
+            raise ValueError('out must be a one dimensional array with'
+                             ' at least {} elements'.format(values.size))
+        result = out
+
+    keep = numpy.empty(min(block_size, values.size), dtype=bool)
+    tmp = numpy.empty_like(keep)
+    n = 0
+    for start in range(0, values.size, block_size):
+        block = values[start:start + block_size]
+        k = keep[:len(block)]
+        t = tmp[:len(block)]
+        numpy.isfinite(block, out=k)
+        if mask is not None:
+            numpy.logical_not(mask[start:start + block_size], out=t)
+            k &= t
+        if vmin is not None:
+            numpy.greater_equal(block, vmin, out=t)
+            k &= t
+        if vmax is not None:
+            numpy.less_equal(block, vmax, out=t)
+            k &= t
+        count = numpy.count_nonzero(k)
+        dest = result[n:n + count]
+        if dest.dtype == block.dtype:
+            numpy.compress(k, block, out=dest)
+        else:
+            dest[...] = block[k]
+        n += count
+
+    if out is None:
+        # Shrinking the buffer we own does not copy the values:
+        result.resize(n, refcheck=False)
+        return result
+    return result[:n]
+
+
+def iterchunks(data, chunksize=2 ** 16):
     """
-    xs = numpy.sort(finitevalues(data))
+    Iterate over `data` in blocks of roughly `chunksize` elements.
 
-    if normed:
-        ys = numpy.linspace(1/len(xs), 1, len(xs))
+    Parameters
+    ----------
+    data : array-like or iterable of array-likes
+        If it is a `numpy.ndarray` (including `numpy.memmap` and
+        `numpy.ma.MaskedArray`), it is flattened and sliced into blocks
+        of `chunksize` elements.  If it has ``shape`` and supports
+        slicing (e.g., HDF5/zarr datasets and dask arrays), it is
+        sliced along the first axis so that each block holds about
+        `chunksize` elements; only one block is loaded at a time.
+        Otherwise, it is treated as an iterable of blocks.
+    chunksize : int
+        Number of elements in each block.
+
+    Yields
+    ------
+    block : numpy.ndarray
+
+    Examples
+    --------
+    >>> [b.tolist() for b in iterchunks(numpy.arange(5), 2)]
+    [[0, 1], [2, 3], [4]]
+    >>> [b.tolist() for b in iterchunks([[0, 1], [2]])]
+    [[0, 1], [2]]
+
+    """
+    if isinstance(data, numpy.ndarray):
+        data = data.reshape(-1)
+        for start in range(0, data.size, chunksize):
+            yield data[start:start + chunksize]
+    elif hasattr(data, 'shape') and hasattr(data, '__getitem__'):
+        rowsize = int(numpy.prod(data.shape[1:]))
+        step = max(1, chunksize // max(rowsize, 1))
+        for start in range(0, data.shape[0], step):
+            yield numpy.asanyarray(data[start:start + step])
     else:
-        ys = numpy.arange(1, len(xs))
-    return xs, ys
+        for block in data:
+            yield numpy.asanyarray(block)
 
 
-def cumhist(data, normed=True, ylabel=None, ax=None,
+def worker_count(n_jobs):
+    """
+    Number of workers for `n_jobs`.
+
+    None means 1 and negative values count from the number of CPUs
+    (-1 means all CPUs).
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpu_count() + 1 + n_jobs)
+    return n_jobs
+
+
+def map_ordered(func, iterable, n_workers=1):
+    """
+    Like ``map(func, iterable)`` but evaluated on a pool of threads.
+
+    The results are yielded in the order of `iterable`.  At most
+    ``2 * n_workers`` items are submitted ahead, so that `iterable`
+    (e.g., chunks read from disk) is consumed lazily.  It is useful
+    for functions spending most of the time in numpy which releases
+    the GIL.
+
+    >>> list(map_ordered(lambda x: x * 2, range(5), n_workers=2))
+    [0, 2, 4, 6, 8]
+
+    """
+    if n_workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+    pool = ThreadPool(n_workers)
+    try:
+        pending = deque()
+        for item in iterable:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+def cdf(data, normed=True, npoints=None):
+    """
+    Calculate cumulative distribution function from `data`.
+
+    `data` may also be a `.CDFSummary`, in which case its knots are
+    returned.
+
+    If `npoints` is given and there are more finite values than that,
+    the CDF is evaluated only at `npoints` quantile knots (evenly
+    spaced in probability) which does not require sorting the whole
+    data.
+    """
+    if not isinstance(data, CDFSummary):
+        values = finitevalues(data)
+        if npoints is None or len(values) <= npoints:
+            xs = numpy.sort(values)
+            count = len(xs)
+            return xs, numpy.arange(1, count + 1) / (1.0 if not normed
+                                                     else float(count))
+        data = CDFSummary.from_values(values, npoints)
+
+    if normed or data.count is None:
+        return data.xs, data.ps
+    return data.xs, data.ps * data.count
+
+
+def decimate_steps(xs, ys, dx, dy):
+    """
+    Drop vertices of a monotone step curve without visible change.
+
+    Vertices are grouped into cells of size ``dx`` by ``dy`` (e.g.,
+    the data-space size of one pixel).  Only the first and the last
+    vertex in each run of vertices falling into the same cell are
+    kept, so that the curve drawn from the returned vertices deviates
+    from the original curve by at most one cell.
+
+    Parameters
+    ----------
+    xs, ys : array
+        Non-decreasing coordinates of the vertices.
+    dx, dy : float
+        Size of a cell.
+
+    Examples
+    --------
+    >>> xs = numpy.arange(10.0)
+    >>> decimate_steps(xs, xs / 10, 5, 1)
+    (array([0., 4., 5., 9.]), array([0. , 0.4, 0.5, 0.9]))
+
+    """
+    xs = numpy.asarray(xs)
+    ys = numpy.asarray(ys)
+    if len(xs) <= 2:
+        return xs, ys
+    cx = numpy.floor((xs - xs[0]) / dx) if dx > 0 else numpy.zeros(len(xs))
+    cy = numpy.floor((ys - ys[0]) / dy) if dy > 0 else numpy.zeros(len(ys))
+    change = (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])
+    keep = numpy.zeros(len(xs), dtype=bool)
+    keep[0] = keep[-1] = True
+    keep[1:] |= change   # first vertex of a run
+    keep[:-1] |= change  # last vertex of a run
+    return xs[keep], ys[keep]
+
+
+def pixel_size(ax, xs, ys):
+    """
+    Data-space size of one pixel of `ax` spanning the range of `xs`/`ys`.
+    """
+    bbox = ax.get_window_extent()
+    dx = (xs[-1] - xs[0]) / max(bbox.width, 1)
+    dy = (ys[-1] - min(ys[0], 0)) / max(bbox.height, 1)
+    return dx, dy
+
+
+def reduced_cdf(data, normed=True, resolution=None, ax=None):
+    """
+    Calculate CDF reduced to `resolution` (see `.cumhist`).
+    """
+    if resolution == 'auto':
+        xs, ys = cdf(data, normed=normed)
+        if len(xs) > 0:
+            xs, ys = decimate_steps(xs, ys, *pixel_size(ax, xs, ys))
+        return xs, ys
+    return cdf(data, normed=normed, npoints=resolution)
+
+
+def cumhist(data, normed=True, ylabel=None, ax=None, resolution=None,
             **step_kwargs):
     """
     Plot cumulative distribution of `data`.
 
     See also `.cdf`.
 
+    Parameters
+    ----------
+    resolution : None, int or 'auto'
+        If None (default), all finite values in `data` are used.  If
+        an int, the CDF is plotted using `resolution` quantile knots
+        (see `.cdf`).  If ``'auto'``, vertices of the step plot are
+        decimated to the pixel grid of `ax` so that the shape is
+        preserved within one pixel (see `.decimate_steps`).
+
     .. include:: backreferences/adaptiveheatmap.cumhist.examples
     .. raw:: html
 
         <div style='clear:both'></div>
     """
     if ax is None:
+        from matplotlib import pyplot
         ax = pyplot.gca()
     if ylabel is None:
         if normed:
@@ -72,7 +333,7 @@ def cumhist(data, normed=True, ylabel=None, ax=None,
         else:
             ylabel = 'Cumulative Count'
 
-    xs, ys = cdf(data, normed=normed)
+    xs, ys = reduced_cdf(data, normed=normed, resolution=resolution, ax=ax)
     lines = ax.step(xs, ys, **step_kwargs)
     ax.set_ylabel(ylabel)
     return lines
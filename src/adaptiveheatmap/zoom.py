@@ -0,0 +1,295 @@
+"""
+Refit the quantile norm to the data within the current view.
+"""
+
+import warnings
+
+import numpy
+
+from .pyramid import _as_float
+from .quantiles import ExactQuantile, WeightedSample
+from .spatial import image_slices, RectilinearIndex
+from .utils import filtered_values
+
+
+class TileSummaries(object):
+    """
+    Quantile summaries of square tiles of a 2D array.
+
+    Each tile is summarized by `knots` equally weighted quantiles, the
+    number of finite values and the exact minimum and maximum.  The
+    distribution within any rectangular region is then estimated by a
+    weighted quantile of the knots of the tiles overlapping it,
+    without touching the data.  Tiles partially in the region are
+    weighted by the overlapping fraction (and their minimum and
+    maximum are used as-is).
+
+    Coarser levels of summaries are built by merging 2x2 tiles of the
+    previous level, until a single tile covers the data.  A region is
+    estimated from the finest level at which it overlaps at most
+    `max_tiles` tiles, so that the cost of `sample` is bounded
+    whatever the size of the region.
+
+    Parameters
+    ----------
+    data : 2D array-like
+        It is read in slabs of tile rows (e.g., a `numpy.memmap`).
+    tile_size : int
+        Number of rows and columns of each tile.
+    knots : int
+        Number of quantiles stored per tile.
+    max_tiles : int
+        Maximum number of tiles used by `sample`.
+
+    Attributes
+    ----------
+    knots : array of shape ``(rows, cols, knots)``
+    counts, mins, maxs : arrays of shape ``(rows, cols)``
+        Summaries of the finest level.
+    levels : list of tuples
+        ``(knots, counts, mins, maxs)`` of each level, finest first;
+        tiles at level ``i`` have ``tile_size * 2 ** i`` rows and
+        columns.
+
+    """
+
+    def __init__(self, data, tile_size=64, knots=16, slab_size=2 ** 22,
+                 max_tiles=1024):
+        self.shape = tuple(data.shape)
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        height, width = self.shape
+        nrows = max(1, slab_size // (tile_size * tile_size *
+                                     -(-width // tile_size)))
+        parts = [self._summarize(data[start:start + nrows * tile_size],
+                                 knots)
+                 for start in range(0, height, nrows * tile_size)]
+        self.knots, self.counts, self.mins, self.maxs = [
+            numpy.concatenate(p) for p in zip(*parts)]
+        self.levels = [(self.knots, self.counts, self.mins, self.maxs)]
+        while self.levels[-1][1].size > 1:
+            self.levels.append(self._merge(*self.levels[-1]))
+
+    def _summarize(self, slab, knots):
+        ts = self.tile_size
+        slab = _as_float(slab)
+        h, w = slab.shape
+        h2 = -(-h // ts)
+        w2 = -(-w // ts)
+        padded = numpy.full((h2 * ts, w2 * ts), numpy.nan)
+        padded[:h, :w] = slab
+        tiles = padded.reshape((h2, ts, w2, ts)).transpose((0, 2, 1, 3))
+        tiles = tiles.reshape((h2, w2, ts * ts))
+        finite = numpy.isfinite(tiles)
+        counts = finite.sum(axis=-1)
+        # Sort non-finite values to the end of each tile:
+        tiles = numpy.where(finite, tiles, numpy.inf)
+        tiles.sort(axis=-1)
+        ps = (numpy.arange(knots) + 0.5) / knots
+        idx = (ps * counts[..., None]).astype(int)
+        values = numpy.take_along_axis(tiles, idx, axis=-1)
+        mins = tiles[..., 0]
+        last = numpy.maximum(counts - 1, 0)[..., None]
+        maxs = numpy.take_along_axis(tiles, last, axis=-1)[..., 0]
+        empty = counts == 0
+        mins[empty] = maxs[empty] = numpy.nan
+        return values, counts, mins, maxs
+
+    @staticmethod
+    def _merge(knots, counts, mins, maxs):
+        """
+        Summarize 2x2 blocks of tiles by tiles of the next level.
+        """
+        rows, cols, k = knots.shape
+        h2 = -(-rows // 2)
+        w2 = -(-cols // 2)
+
+        def blocks(array, fill):
+            padded = numpy.full((h2 * 2, w2 * 2) + array.shape[2:], fill,
+                                dtype=array.dtype)
+            padded[:rows, :cols] = array
+            padded = padded.reshape((h2, 2, w2, 2) + array.shape[2:])
+            return padded.swapaxes(1, 2).reshape((h2, w2, 4, -1))
+
+        items = blocks(knots, numpy.inf).reshape((h2, w2, 4 * k))
+        child_counts = blocks(counts, 0)[..., 0]
+        weights = numpy.repeat(child_counts / float(k), k, axis=-1)
+        order = numpy.argsort(items, axis=-1, kind='mergesort')
+        items = numpy.take_along_axis(items, order, axis=-1)
+        ranks = numpy.cumsum(numpy.take_along_axis(weights, order, axis=-1),
+                             axis=-1)
+        merged_counts = child_counts.sum(axis=-1)
+        ps = (numpy.arange(k) + 0.5) / k
+        targets = ps * merged_counts[..., None]
+        # Index of the first item whose cumulative weight exceeds each
+        # target rank:
+        idx = (ranks[..., None, :] <= targets[..., :, None]).sum(axis=-1)
+        idx = numpy.minimum(idx, 4 * k - 1)
+        merged = numpy.take_along_axis(items, idx, axis=-1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN
+            merged_mins = numpy.nanmin(blocks(mins, numpy.nan)[..., 0],
+                                       axis=-1)
+            merged_maxs = numpy.nanmax(blocks(maxs, numpy.nan)[..., 0],
+                                       axis=-1)
+        return merged, merged_counts, merged_mins, merged_maxs
+
+    def _coverage(self, index, tiles, size, ts):
+        starts = numpy.arange(tiles.start, tiles.stop) * ts
+        stops = numpy.minimum(starts + ts, size)
+        covered = (numpy.minimum(stops, index.stop) -
+                   numpy.maximum(starts, index.start))
+        return covered / (stops - starts).astype(float)
+
+    def _tiles(self, rows, cols, ts):
+        return (slice(rows.start // ts, -(-rows.stop // ts)),
+                slice(cols.start // ts, -(-cols.stop // ts)))
+
+    def sample(self, rows, cols):
+        """
+        `.WeightedSample` of the tiles covering `rows` x `cols` of data.
+        """
+        for level, (knots, counts, mins, maxs) in enumerate(self.levels):
+            ts = self.tile_size * 2 ** level
+            r, c = self._tiles(rows, cols, ts)
+            if (r.stop - r.start) * (c.stop - c.start) <= self.max_tiles:
+                break
+        counts = counts[r, c]
+        if not counts.any():
+            return WeightedSample([], [])
+        knots = knots[r, c]
+        # Tiles at the border of the view are weighted by the covered
+        # fraction:
+        weights = (counts *
+                   self._coverage(rows, r, self.shape[0], ts)[:, None] *
+                   self._coverage(cols, c, self.shape[1], ts)[None, :])
+        weights = numpy.repeat(weights / float(knots.shape[-1]),
+                               knots.shape[-1])
+        return WeightedSample.from_items(
+            knots, weights,
+            numpy.nanmin(mins[r, c]), numpy.nanmax(maxs[r, c]))
+
+
+class ViewAdaptiveNorm(object):
+    """
+    Refit `AdaptiveHeatmap.norm` to the data in the view of `ax_main`.
+
+    The quantiles are estimated from `TileSummaries` precomputed once,
+    so that refitting on each change of the view does not depend on
+    the size of the data.  Views with at most
+    `exact_limit` elements are refitted exactly from the data.  When
+    the whole data is in view, the original fit is restored.
+
+    Parameters
+    ----------
+    ah : AdaptiveHeatmap
+        Plotted by `imshow` (or `matshow`) or by `pcolormesh` on a
+        rectilinear grid.
+    data : 2D array or None
+        Data shown in `ah` (defaults to the array of the mappable).
+    tile_size, knots, max_tiles
+        Passed to `TileSummaries`.
+    exact_limit : int
+
+    """
+
+    def __init__(self, ah, data=None, tile_size=64, knots=16,
+                 exact_limit=2 ** 18, max_tiles=1024):
+        self.ah = ah
+        mappable = ah.mappable
+        if hasattr(mappable, 'get_extent'):
+            if data is None:
+                data = mappable.get_array()
+            extent = mappable.get_extent()
+            origin = mappable.origin
+            shape = data.shape
+
+            def slices(xlim, ylim):
+                return image_slices(extent, origin, shape, xlim, ylim)
+        else:
+            index = ah.mesh_index
+            if not isinstance(index, RectilinearIndex):
+                raise NotImplementedError(
+                    'View-adaptive norm requires a rectilinear mesh.')
+            if data is None:
+                data = numpy.ma.asarray(mappable.get_array())
+            data = data.reshape(index.shape)
+            slices = index.slices
+        self.data = data
+        self._slices = slices
+        self.exact_limit = exact_limit
+        self._cids = []
+        self._canvas = None
+        self.summaries = TileSummaries(data, tile_size=tile_size,
+                                       knots=knots, max_tiles=max_tiles)
+        norm = ah.norm
+        self._initial = (norm.quantile, norm.vmin, norm.vmax, norm.summary)
+        self._current = None
+
+    def view(self):
+        """
+        Slices of the data (rows, columns) within the view limits.
+        """
+        ax = self.ah.ax_main
+        return self._slices(ax.get_xlim(), ax.get_ylim())
+
+    def _is_full(self, rows, cols):
+        height, width = self.data.shape
+        return (rows.start, rows.stop, cols.start, cols.stop) == (
+            0, height, 0, width)
+
+    def refit(self, *_):
+        """
+        Refit the norm to the current view and refresh the sub-panels.
+
+        Return True if the view changed since the last refit.
+        """
+        rows, cols = self.view()
+        key = (rows.start, rows.stop, cols.start, cols.stop)
+        if key == self._current:
+            return False
+        self._current = key
+        norm = self.ah.norm
+        if self._is_full(rows, cols):
+            quantile, vmin, vmax, summary = self._initial
+            norm._raw_data = norm._filtered_data = None
+            norm.quantile = quantile
+            norm.vmin, norm.vmax = vmin, vmax
+            norm._summary = summary
+        else:
+            size = (rows.stop - rows.start) * (cols.stop - cols.start)
+            if size <= self.exact_limit:
+                state = ExactQuantile()
+                state.update(filtered_values(self.data[rows, cols]))
+            else:
+                state = self.summaries.sample(rows, cols)
+            if state.count == 0:
+                return False
+            norm._refresh(state)
+        self.ah.mappable.changed()
+        self.ah.refresh_sub()
+        return True
+
+    def connect(self):
+        """
+        Refit when the figure is drawn after a change of the view.
+
+        Panning or zooming fires both ``xlim_changed`` and
+        ``ylim_changed``; refitting on ``draw_event`` instead refits
+        once per view, after both limits are updated.  The figure is
+        then redrawn with the refitted norm.
+        """
+        self._canvas = self.ah.figure.canvas
+        self._cids = [self._canvas.mpl_connect('draw_event', self._ondraw)]
+
+    def _ondraw(self, event):
+        if self.refit():
+            event.canvas.draw_idle()
+
+    def disconnect(self):
+        """
+        Stop refitting on changes of the view limits.
+        """
+        for cid in self._cids:
+            self._canvas.mpl_disconnect(cid)
+        self._cids = []